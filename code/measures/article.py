@@ -1,13 +1,11 @@
 import datetime
-from dateutil import parser
-import pytz
+from timestamps import parse_eastern
 
 class Article:
     
     def __init__(self, company, timestamp, headline, article_text, md5_id):
         self.company = company
-        est = pytz.timezone('US/Eastern')
-        self.timestamp = parser.parse(timestamp).replace(tzinfo=pytz.utc).astimezone(est)
+        self.timestamp = parse_eastern(timestamp)
         self.headline = headline
 
         # article_text should be stemmed and filtered articles
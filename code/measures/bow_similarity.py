@@ -1,16 +1,17 @@
 from article import Article
 from measure_constants import MeasureConstants
+from term_ids import TermIds
+from tokenizer import word_tokenize
 
 import numpy as np
 import datetime
 from nltk.stem import PorterStemmer 
-from nltk.tokenize import word_tokenize
 from nltk.corpus import stopwords
 
 stop_words = set(stopwords.words('english'))
 ps = PorterStemmer()
 
-stemDict = dict() # dict from stem to index, for faster set comparisons
+term_ids = TermIds() # stable ids of the stems, the same in every process
 wordDict = dict() # dict from word to stem
 
 def stem(tokenizedWords):
@@ -22,13 +23,10 @@ def stem(tokenizedWords):
     r = []
     for word in tokenizedWords:
         if word in wordDict:
-            add = stemDict[wordDict[word]]
+            add = term_ids.id(wordDict[word])
         else:
             w = ps.stem(word)
-            add = stemDict.get(w)
-            if (add == None):
-                add = len(stemDict)
-                stemDict[w] = add
+            add = term_ids.id(w)
             wordDict[word] = w
         r += [add]
     #ft.end("stem")
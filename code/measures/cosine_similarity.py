@@ -1,10 +1,11 @@
 from article import Article
 from measure_constants import MeasureConstants
+from tokenizer import word_tokenize
 
 import numpy as np
 import datetime
+from collections import Counter
 from nltk.stem import PorterStemmer 
-from nltk.tokenize import word_tokenize
 from nltk.corpus import stopwords
 
 from sklearn.feature_extraction.text import TfidfVectorizer
@@ -55,18 +56,9 @@ class CosineSimilarity:
         num_closest = self.measure_const.NUM_CLOSEST
         curr_article_stemmed = set(curr_article.article_text.split())
         
-        stemmed_articles = [curr_article.article_text] + [s.article_text for s in article_set]
-        td_matrix = vec.fit_transform(stemmed_articles)
-
-        # Using the following method to calculate cosine similarity between documents:
-        # https://stackoverflow.com/questions/8897593/how-to-compute-the-similarity-between-two-text-documents
-
-        # The following line takes the term-document matrix (where each document is represented by a column
-        # vector and each row corresponds to a term), and computes the outer product of the term-document
-        # matrix with itself. The result is a symmetric matrix, the first row of which is the cosine similarity
-        # between the first document and every document in stemmed_articles. Here, I take the first row, and exclude
-        # the first item so we don't include curr_article's cosine similarity with itself. 
-       	sim_scores = (td_matrix * td_matrix.T).A[0][1:]
+        article_list = list(article_set)
+        stemmed_articles = [curr_article.article_text] + [s.article_text for s in article_list]
+        sim_scores = self.similarity_scores(curr_article, article_list)
         
         closest_articles_indices = np.argsort(sim_scores)[::-1][:num_closest]
         closest_articles = np.take(stemmed_articles, closest_articles_indices)
@@ -79,6 +71,24 @@ class CosineSimilarity:
         
         return old_score, closest_neighbor_score
 
+    def similarity_scores(self, curr_article, article_list):
+        """
+        Returns the tf-idf cosine similarity of curr_article with each article of 
+        article_list, as a numpy array in the same order.
+        """
+        stemmed_articles = [curr_article.article_text] + [s.article_text for s in article_list]
+        td_matrix = vec.fit_transform(stemmed_articles)
+
+        # Using the following method to calculate cosine similarity between documents:
+        # https://stackoverflow.com/questions/8897593/how-to-compute-the-similarity-between-two-text-documents
+
+        # The following line takes the term-document matrix (where each document is represented by a column
+        # vector and each row corresponds to a term), and computes the outer product of the term-document
+        # matrix with itself. The result is a symmetric matrix, the first row of which is the cosine similarity
+        # between the first document and every document in stemmed_articles. Here, I take the first row, and exclude
+        # the first item so we don't include curr_article's cosine similarity with itself. 
+        return (td_matrix * td_matrix.T).toarray()[0][1:]
+
     def is_old_news(self, old):
         return old > self.measure_const.OLD_NEWS
 
@@ -92,4 +102,211 @@ class CosineSimilarity:
         if old == 0:
             return False
         reprint = (closest_neighbor / old) < self.measure_const.CLOSEST_NEIGHBOR_SHARE
-        return (old > self.measure_const.OLD_NEWS) * reprint
\ No newline at end of file
+        return (old > self.measure_const.OLD_NEWS) * reprint
+
+
+class TfidfWindow:
+    """
+    The articles of one company within the look back: the terms of each one, and 
+    the number of these articles each term is found in (its document frequency), 
+    updated as articles are added and removed. Terms are numbered in the window, 
+    in order of first appearance, and renumbered (see compact) once most of the 
+    numbered terms are no longer in any article, so the window only holds about 
+    the terms of its articles. Without counted, only the articles are kept.
+    """
+
+    def __init__(self, counted = True):
+        self.counted = counted
+        self.rows = dict() # id of an article -> (article, columns, weights)
+        self.columns = dict()
+        self.terms = []
+        self.df = np.zeros(0, dtype=np.int64)
+        self.live = 0 # Terms with a document frequency
+
+    def column(self, term):
+        c = self.columns.get(term)
+        if c is None:
+            c = self.columns[term] = len(self.terms)
+            self.terms.append(term)
+            if c == len(self.df):
+                self.df = np.concatenate([self.df, np.zeros(max(64, c), dtype=np.int64)])
+        return c
+
+    def add(self, article, columns, weights):
+        """
+        Adds article, with the (sorted, distinct) columns of its terms and their 
+        weights.
+        """
+        self.rows[id(article)] = (article, columns, weights)
+        if self.counted:
+            self.df[columns] += 1
+            self.live += int(np.count_nonzero(self.df[columns] == 1))
+
+    def remove(self, article):
+        _, columns, _ = self.rows.pop(id(article))
+        if self.counted:
+            self.df[columns] -= 1
+            self.live -= int(np.count_nonzero(self.df[columns] == 0))
+            if len(self.terms) > 2 * self.live + 64:
+                self.compact()
+
+    def compact(self):
+        """
+        Drops the terms that are in none of the articles, and renumbers the 
+        others in the same order, so the columns of the articles stay sorted.
+        """
+        keep = np.flatnonzero(self.df[:len(self.terms)] > 0)
+        renumber = np.full(len(self.terms), -1, dtype=np.intp)
+        renumber[keep] = np.arange(len(keep))
+        self.terms = [self.terms[c] for c in keep.tolist()]
+        self.columns = {term: c for c, term in enumerate(self.terms)}
+        self.df = np.concatenate([self.df[keep], np.zeros(max(64, len(keep)), dtype=np.int64)])
+        self.rows = {key: (article, renumber[columns], weights) for key, (article, columns, weights) in self.rows.items()}
+
+
+class IncrementalTfidf:
+    """
+    Tf-idf cosine similarity of an article with the articles of its company, 
+    without fitting a TfidfVectorizer on every window. Terms are split by the 
+    analyzer of the vectorizer, and the windows (see TfidfWindow) are brought in 
+    line with the article sets they are given: articles that left the set are 
+    removed, new ones added.
+
+    With idf "window", the document frequencies are those of the window and the 
+    article, as fit_transform counts them: the term counts of the articles are 
+    kept, and weighted with the idf of the window when they are scored. With idf 
+    "global", the document frequencies are those of every article (by md5_id) 
+    added so far, and the weighted vector of an article and its norm are computed 
+    once, when it is added. Either way, scoring is one pass over the arrays of the 
+    articles of the window, matched with the sorted columns of the article, so it 
+    costs about the size of the window, not of every term ever seen.
+    """
+
+    def __init__(self, idf="window", vectorizer=None):
+        if idf not in ("window", "global"):
+            raise ValueError("idf must be 'window' or 'global'")
+        self.idf = idf
+        self.analyzer = (vectorizer or TfidfVectorizer()).build_analyzer()
+        self.windows = dict()
+        self.terms_cache = dict()
+        self.global_columns = dict()
+        self.global_df = np.zeros(0, dtype=np.int64)
+        self.seen = set()
+
+    def terms(self, text):
+        """Returns the Counter of the terms of text, cached for the last texts."""
+        terms = self.terms_cache.get(text)
+        if terms is None:
+            if len(self.terms_cache) >= 4096:
+                self.terms_cache.clear()
+            terms = self.terms_cache[text] = Counter(self.analyzer(text))
+        return terms
+
+    def global_column(self, term):
+        c = self.global_columns.get(term)
+        if c is None:
+            c = self.global_columns[term] = len(self.global_columns)
+            if c == len(self.global_df):
+                self.global_df = np.concatenate([self.global_df, np.zeros(max(1024, c), dtype=np.int64)])
+        return c
+
+    def global_vector(self, terms):
+        """
+        Returns the sorted global columns of terms and their l2 normalized tf-idf 
+        weights, with the document frequencies of the articles added so far.
+        """
+        columns = np.fromiter((self.global_column(t) for t in terms), dtype=np.intp, count=len(terms))
+        counts = np.fromiter(terms.values(), dtype=np.float64, count=len(terms))
+        order = np.argsort(columns)
+        columns, counts = columns[order], counts[order]
+        weights = counts * (np.log((1 + len(self.seen)) / (1 + self.global_df[columns])) + 1)
+        norm = np.sqrt(np.dot(weights, weights))
+        return columns, (weights / norm if norm else weights)
+
+    def add(self, window, article):
+        terms = self.terms(article.article_text)
+        if self.idf == "window":
+            columns = np.fromiter((window.column(t) for t in terms), dtype=np.intp, count=len(terms))
+            counts = np.fromiter(terms.values(), dtype=np.float64, count=len(terms))
+            order = np.argsort(columns)
+            window.add(article, columns[order], counts[order])
+            return
+        if article.md5_id not in self.seen:
+            self.seen.add(article.md5_id)
+            columns = [self.global_column(t) for t in terms]
+            self.global_df[columns] += 1
+        window.add(article, *self.global_vector(terms))
+
+    def window(self, company, article_list):
+        """Returns the window of company, brought in line with article_list."""
+        window = self.windows.get(company)
+        if window is None:
+            window = self.windows[company] = TfidfWindow(self.idf == "window")
+        present = {id(a) for a in article_list}
+        for key in [key for key in window.rows if key not in present]:
+            window.remove(window.rows[key][0])
+        for a in article_list:
+            if id(a) not in window.rows:
+                self.add(window, a)
+        return window
+
+    def scores(self, curr_article, article_list):
+        """
+        Returns the tf-idf cosine similarity of curr_article with each article of 
+        article_list (the articles of its company in the look back), as a numpy 
+        array in the same order.
+        """
+        window = self.window(curr_article.company, article_list)
+        rows = [window.rows[id(a)] for a in article_list]
+        lengths = np.array([len(r[1]) for r in rows], dtype=np.intp)
+        row_ids = np.repeat(np.arange(len(rows)), lengths)
+        columns = np.concatenate([r[1] for r in rows] + [np.zeros(0, dtype=np.intp)])
+        weights = np.concatenate([r[2] for r in rows] + [np.zeros(0)])
+        terms = self.terms(curr_article.article_text)
+        if self.idf == "window":
+            n = len(rows) + 1
+            counts = np.fromiter(terms.values(), dtype=np.float64, count=len(terms))
+            known = np.fromiter((window.columns.get(t, -1) for t in terms), dtype=np.intp, count=len(terms))
+            inside = known >= 0
+            idf = np.full(len(terms), np.log((1 + n) / 2) + 1) # Terms of the article only
+            idf[inside] = np.log((1 + n) / (2 + window.df[known[inside]])) + 1
+            query = counts * idf
+            query_norm = np.sqrt(np.dot(query, query))
+            order = np.argsort(known[inside])
+            query_columns = known[inside][order]
+            query = query[inside][order] / (query_norm or 1)
+            positions, found = self.match(query_columns, columns)
+            weights = weights * (np.log((1 + n) / (1 + window.df[columns] + found)) + 1)
+            norms = np.sqrt(np.bincount(row_ids, weights=weights * weights, minlength=len(rows)))
+            weights = weights / np.where(norms > 0, norms, 1)[row_ids]
+        else:
+            query_columns, query = self.global_vector(terms)
+            positions, found = self.match(query_columns, columns)
+        products = np.where(found, weights * query[positions], 0) if len(query) else np.zeros(len(columns))
+        return np.bincount(row_ids, weights=products, minlength=len(rows))
+
+    def match(self, query_columns, columns):
+        """
+        Returns the position of each one of columns among the sorted 
+        query_columns, and whether it is there.
+        """
+        if len(query_columns) == 0:
+            return np.zeros(len(columns), dtype=np.intp), np.zeros(len(columns), dtype=bool)
+        positions = np.searchsorted(query_columns, columns)
+        positions[positions == len(query_columns)] = 0
+        return positions, query_columns[positions] == columns
+
+
+class IncrementalCosineSimilarity(CosineSimilarity):
+    """
+    CosineSimilarity scored with an IncrementalTfidf engine, kept across calls, 
+    instead of a TfidfVectorizer fit on every window. With idf "window" the scores 
+    are those of CosineSimilarity (up to rounding).
+    """
+
+    def __init__(self, measure_const = MeasureConstants(), idf = "window"):
+        super().__init__(measure_const)
+        self.engine = IncrementalTfidf(idf, vec)
+
+    def similarity_scores(self, curr_article, article_list):
+        return self.engine.scores(curr_article, article_list)
@@ -1,94 +1,158 @@
 from article import Article
+from bow_similarity import BOWSimilarity
 from measure_constants import MeasureConstants
 
 import numpy as np
 import datetime
-from nltk.stem import PorterStemmer 
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-
-stop_words = set(stopwords.words('english'))
-ps = PorterStemmer()
 
 # Locality-Sensitive Hashing
-class LSHSimilarity:
+class LSHSignatures:
+    """
+    MinHash signatures of sets of term ids (see term_ids.py): bands * rows hash
+    functions (a * x + b mod 2 ** 64, keeping the top 32 bits), and the minimum
+    of each over the ids of a set. Two sets share the value of a hash function
+    with a probability of their Jaccard similarity, and all the rows of a band
+    with that probability to the power rows.
+    """
+
+    def __init__(self, bands=32, rows=4, seed=0):
+        self.bands = bands
+        self.rows = rows
+        rng = np.random.default_rng(seed)
+        size = bands * rows
+        self.a = rng.integers(1, 2 ** 63, size, dtype=np.uint64) * np.uint64(2) + np.uint64(1) # odd
+        self.b = rng.integers(0, 2 ** 63, size, dtype=np.uint64)
+
+    def signature(self, ids):
+        """Returns the signature of a set of term ids, a numpy uint32 array."""
+        if len(ids) == 0:
+            return np.full(self.bands * self.rows, 2 ** 32 - 1, dtype=np.uint32)
+        x = np.fromiter(ids, dtype=np.uint64, count=len(ids))
+        with np.errstate(over="ignore"):
+            hashed = self.a[:, None] * x[None, :] + self.b[:, None]
+        return (hashed.min(axis=1) >> np.uint64(32)).astype(np.uint32)
+
+    def keys(self, signature):
+        """Returns the bucket of signature in each band."""
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+                for band in range(self.bands)]
+
+
+class LSHWindow:
+    """
+    The articles of one company within the look back and their LSH buckets:
+    for each band, the articles sharing a band of their signatures.
+    """
+
+    def __init__(self):
+        self.rows = dict() # id of an article -> (article, bucket keys)
+        self.buckets = dict()
+
+    def add(self, article, keys):
+        self.rows[id(article)] = (article, keys)
+        for key in keys:
+            self.buckets.setdefault(key, set()).add(id(article))
+
+    def remove(self, article):
+        _, keys = self.rows.pop(id(article))
+        for key in keys:
+            bucket = self.buckets[key]
+            bucket.discard(id(article))
+            if not bucket:
+                del self.buckets[key]
+
+    def candidates(self, keys):
+        """Returns the articles sharing at least one bucket with keys."""
+        found = set()
+        for key in keys:
+            found.update(self.buckets.get(key, ()))
+        return [self.rows[i][0] for i in found]
+
 
-    def __init__(self, measure_const = MeasureConstants()):
-        self.measure_const = measure_const
+class LSHSimilarity(BOWSimilarity):
+    """
+    BOWSimilarity scored only on the articles of the window that share an LSH
+    bucket with the current article (see LSHSignatures), instead of all of them.
+    The scores of the candidates are exact; the articles LSH misses are not
+    scored at all, so Old(s) and ClosestNeighbor(s) can be lower than those of
+    BOWSimilarity. More bands, or fewer rows, find more of them for more
+    candidates: a pair is a candidate with probability 1 - (1 - J ** rows) ** bands,
+    for a Jaccard similarity J.
+
+    Without candidates, the scores are 0 and the closest id None, unless fallback,
+    with which every article of the window is scored.
+    """
+
+    def __init__(self, measure_const = MeasureConstants(), bands = 32, rows = 4, seed = 0, fallback = False):
+        super().__init__(measure_const)
+        self.signatures = LSHSignatures(bands, rows, seed)
+        self.fallback = fallback
+        self.windows = dict()
+        self.keys_cache = dict()
+        self.queries, self.window_total, self.scored, self.empty = 0, 0, 0, 0
 
     def k_shingling(self, text, k=10):
-        shingles = set()
-        for char in text[:-k]:
-            shingles.add(text[char:char+k])
-        return shingles
-        
-    def stem_and_filter(self, text):
-        """
-        Takes an article's text and tokenizes the article text into a set, then
-        removes stop words from the set and stems all the remaining words. Returns
-        a set of stemmed words in the article.
-        """
-        tokenized = set(text.split())
-        tokenized.difference_update(stop_words) # Remove stop words from tokenized text
-        stemmed = {ps.stem(w) for w in tokenized}
-        return stemmed
+        """Returns the set of the k character substrings of text."""
+        return {text[i:i + k] for i in range(len(text) - k + 1)}
 
-    def bow_similarity_score(self, s1, s2):
+    def keys(self, article):
         """
-        Returns the bag-of-words similarity score between an article s1 and article s2.
-        Specifically, measures percentage of words in s1 that are also in s2. 
-        s1, s2 must be sets representing tokenized and stemmed articles.
+        Returns the bucket keys of article, cached by its set of terms (shared by
+        the articles of the companies of a document).
         """
-        return len(s1.intersection(s2)) / len(s1)
+        text = article.article_text
+        cached = self.keys_cache.get(id(text))
+        if cached is None or cached[0] is not text:
+            if len(self.keys_cache) >= 4096:
+                self.keys_cache.clear()
+            cached = self.keys_cache[id(text)] = (text, self.signatures.keys(self.signatures.signature(text)))
+        return cached[1]
+
+    def window(self, company, article_list):
+        """Returns the LSH window of company, brought in line with article_list."""
+        window = self.windows.get(company)
+        if window is None:
+            window = self.windows[company] = LSHWindow()
+        present = {id(a) for a in article_list}
+        for key in [key for key in window.rows if key not in present]:
+            window.remove(window.rows[key][0])
+        for a in article_list:
+            if id(a) not in window.rows:
+                window.add(a, self.keys(a))
+        return window
 
     def compute_sim_measure(self, curr_article, article_set):
         """
-        Calculates Old(s) and ClosestNeighbor(s), where s is curr_article. 
-        
+        Calculates Old(s) and ClosestNeighbor(s), where s is curr_article, as
+        BOWSimilarity does, over the candidates of curr_article.
+
         Arguments:
             curr_article: An Article object for which to calculate the scores
             article_set: A set of Article objects with the same company as curr_article.company
-            num_closest: The number of closest (by similarity score) stories to look at 
-                to calculate Old(s)
-        
+
         Returns:
             old_score: Old(s)
             closest_neighbor_score: ClosestNeighbor(s)
+            closest_neighbor_id: The md5 id of the closest article, None without candidates
+        """
+        article_list = list(article_set)
+        window = self.window(curr_article.company, article_list)
+        candidates = window.candidates(self.keys(curr_article))
+        self.queries += 1
+        self.window_total += len(article_list)
+        if not candidates:
+            self.empty += 1
+            if not self.fallback:
+                return 0.0, 0.0, None
+            candidates = article_list
+        self.scored += len(candidates)
+        return super().compute_sim_measure(curr_article, candidates)
+
+    def report(self):
+        """
+        Returns a one line summary of the articles scored, out of those of the
+        windows.
         """
-        num_closest = self.measure_const.NUM_CLOSEST
-        curr_article_stemmed = set(curr_article.article_text.split())
-        
-        stemmed_articles = [curr_article.article_text] + [s.article_text for s in article_set]
-        td_matrix = vec.fit_transform(stemmed_articles)
-
-        # Using the following method to calculate cosine similarity between documents:
-        # https://stackoverflow.com/questions/8897593/how-to-compute-the-similarity-between-two-text-documents
-
-        # The following line takes the term-document matrix (where each document is represented by a column
-        # vector and each row corresponds to a term), and computes the outer product of the term-document
-        # matrix with itself. The result is a symmetric matrix, the first row of which is the cosine similarity
-        # between the first document and every document in stemmed_articles. Here, I take the first row, and exclude
-        # the first item so we don't include curr_article's cosine similarity with itself. 
-       	sim_scores = (td_matrix * td_matrix.T).A[0][1:]
-        
-        closest_articles_indices = np.argsort(sim_scores)[::-1][:num_closest]
-        closest_articles = np.take(stemmed_articles, closest_articles_indices)
-        closest_articles_words = [c.split() for c in closest_articles]
-        closest_articles_union = set().union(*closest_articles_words)
-        intersect_with_closest_n = curr_article_stemmed.intersection(closest_articles_union)
-        
-        old_score = len(intersect_with_closest_n) / len(curr_article_stemmed)
-        closest_neighbor_score = self.bow_similarity_score(curr_article_stemmed, closest_articles_words[0])
-        
-        return old_score, closest_neighbor_score
-
-    def is_old_news(self, old):
-        return old > self.measure_const.OLD_NEWS
-
-    def is_reprint(self, old, closest_neighbor):
-        reprint = (closest_neighbor / old) >= self.measure_const.CLOSEST_NEIGHBOR_SHARE
-        return (old > self.measure_const.OLD_NEWS) * reprint
-
-    def is_recombination(self, old, closest_neighbor):
-        reprint = (closest_neighbor / old) < self.measure_const.CLOSEST_NEIGHBOR_SHARE
-        return (old > self.measure_const.OLD_NEWS) * reprint
\ No newline at end of file
+        return "LSH... {0} bands of {1} rows, {2} of {3} articles scored ({4:.1%}), {5} of {6} articles without candidates".format(
+            self.signatures.bands, self.signatures.rows, self.scored, self.window_total,
+            self.scored / max(self.window_total, 1), self.empty, self.queries)
@@ -0,0 +1,140 @@
+from hashlib import blake2b
+
+import numpy as np
+
+# Ids are the leading bits of a 64 bit hash. With 64 bits, a collision is
+# expected once in about 2**32 distinct stems, far more than any corpus has.
+TERM_BITS = 64
+
+
+def term_id(term, bits=TERM_BITS):
+    """
+    Stable id of a term (stem): the same in every process and every run,
+    unlike hash(term) or an id given in order of appearance.
+
+    Arguments:
+        term: A string.
+        bits: The size of the id space, at most 64.
+
+    Returns:
+        An int from 0 to 2 ** bits - 1.
+    """
+    digest = blake2b(term.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") >> (64 - bits)
+
+
+def id_dtype(bits=TERM_BITS):
+    """Returns the numpy dtype of the ids of a bits wide id space."""
+    return np.uint32 if bits <= 32 else np.uint64
+
+
+def find_collisions(terms, bits=TERM_BITS):
+    """
+    Returns the groups (lists) of distinct terms that share an id, for
+    instance among the vocabulary of a token store.
+    """
+    groups = dict()
+    for term in set(terms):
+        groups.setdefault(term_id(term, bits), []).append(term)
+    return [sorted(group) for group in groups.values() if len(group) > 1]
+
+
+class TermIds:
+    """
+    Caches the ids of the terms seen by one process, and remembers the first
+    term of each id to report collisions between the terms it has seen.
+    """
+
+    def __init__(self, bits=TERM_BITS):
+        self.bits = bits
+        self.dtype = id_dtype(bits)
+        self.ids = dict()
+        self.terms = dict()
+        self.collisions = []
+
+    def id(self, term):
+        """Returns the id of term, see term_id."""
+        i = self.ids.get(term)
+        if i is None:
+            i = self.ids[term] = term_id(term, self.bits)
+            first = self.terms.setdefault(i, term)
+            if first != term:
+                self.collisions.append((first, term))
+        return i
+
+    def array(self, terms):
+        """
+        Returns the sorted, distinct ids of terms as a numpy array, the compact
+        form of a set of terms.
+        """
+        return np.unique(np.fromiter((self.id(t) for t in terms), dtype=self.dtype))
+
+    def report(self):
+        """
+        Returns a one line summary of the terms seen and the collisions found
+        between them.
+        """
+        found = ", ".join(" = ".join(pair) for pair in self.collisions[:10])
+        return "Term ids... {0} terms, {1} bits, {2} collisions{3}".format(
+            len(self.ids), self.bits, len(self.collisions), (": " + found) if found else "")
+
+
+def overlap(ids, others):
+    """
+    Number of the ids found in others.
+
+    Arguments:
+        ids: A sorted numpy array of distinct ids.
+        others: A sorted numpy array of distinct ids, e.g. from union.
+
+    Returns:
+        The size of the intersection of both arrays.
+    """
+    if len(others) == 0:
+        return 0
+    positions = np.searchsorted(others, ids)
+    positions[positions == len(others)] = 0
+    return int(np.count_nonzero(others[positions] == ids))
+
+
+def overlaps(ids, arrays):
+    """
+    Number of the ids found in each of several arrays, all in one pass over
+    their concatenation.
+
+    Arguments:
+        ids: A sorted numpy array of distinct ids.
+        arrays: A list of numpy arrays of distinct ids.
+
+    Returns:
+        A numpy int array, the size of the intersection of ids and each array.
+    """
+    if len(arrays) == 0 or len(ids) == 0:
+        return np.zeros(len(arrays), dtype=np.int64)
+    others = np.concatenate(arrays)
+    positions = np.searchsorted(ids, others)
+    positions[positions == len(ids)] = 0
+    found = np.zeros(len(others) + 1, dtype=np.int64)
+    np.cumsum(ids[positions] == others, out=found[1:])
+    ends = np.cumsum([len(a) for a in arrays])
+    return np.diff(found[ends], prepend=0)
+
+
+def union(arrays):
+    """Returns the sorted, distinct ids of several arrays of ids."""
+    if len(arrays) == 1:
+        return arrays[0]
+    return np.unique(np.concatenate(arrays))
+
+
+def bitmap(ids):
+    """
+    Returns the ids as the bits of a Python int, so that the overlap of two
+    sets of ids is (a & b).bit_count(). Only worth it for small ids.
+    """
+    if len(ids) == 0:
+        return 0
+    ids = np.asarray(ids, dtype=np.int64)
+    flags = np.zeros(int(ids.max()) // 8 + 1, dtype=np.uint8)
+    np.bitwise_or.at(flags, ids >> 3, (1 << (ids & 7)).astype(np.uint8))
+    return int.from_bytes(flags.tobytes(), "little")
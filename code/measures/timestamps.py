@@ -0,0 +1,129 @@
+import calendar
+import datetime
+import re
+from functools import lru_cache
+
+import numpy as np
+import pytz
+from dateutil import parser
+
+EASTERN = pytz.timezone('US/Eastern')
+
+# The display-date of DJN articles, e.g. 20010102T000140Z (UTC).
+DJN_DATE = re.compile(r"([0-9]{4})([0-9]{2})([0-9]{2})T([0-9]{2})([0-9]{2})([0-9]{2})Z\Z")
+DJN_LENGTH = 16
+DIGITS = [0, 1, 2, 3, 4, 5, 6, 7, 9, 10, 11, 12, 13, 14]
+DAYS_IN_MONTH = np.array([0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+
+def _djn_epoch(date_string):
+    """
+    Returns the seconds since the epoch of a valid date in the DJN format, or
+    None for any other string (left to dateutil, which raises its own errors).
+    """
+    match = DJN_DATE.match(date_string)
+    if match is None:
+        return None
+    try:
+        fields = datetime.datetime(*map(int, match.groups()))
+    except ValueError:
+        return None
+    return float(calendar.timegm(fields.timetuple()))
+
+
+@lru_cache(maxsize=1 << 16)
+def parse_epoch(date_string):
+    """
+    Same as dateutil.parser.parse(date_string).timestamp(): dates without a
+    time zone are taken as local time.
+
+    Arguments:
+        date_string: A date, usually the display-date of an article.
+
+    Returns:
+        The seconds since the epoch, as a float.
+    """
+    epoch = _djn_epoch(date_string)
+    if epoch is None:
+        return parser.parse(date_string).timestamp()
+    return epoch
+
+
+@lru_cache(maxsize=1 << 16)
+def parse_utc_epoch(date_string):
+    """
+    Like parse_epoch, but the date is taken as UTC whatever its time zone, as
+    in parser.parse(date_string).replace(tzinfo=pytz.utc).
+    """
+    epoch = _djn_epoch(date_string)
+    if epoch is None:
+        return parser.parse(date_string).replace(tzinfo=pytz.utc).timestamp()
+    return epoch
+
+
+def to_eastern(epoch):
+    """
+    Returns the US/Eastern datetime of seconds since the epoch, the same as
+    converting the UTC datetime with astimezone.
+    """
+    return datetime.datetime.fromtimestamp(epoch, EASTERN)
+
+
+@lru_cache(maxsize=1 << 16)
+def parse_eastern(date_string):
+    """
+    Same as parser.parse(date_string).replace(tzinfo=pytz.utc).astimezone(EASTERN).
+    The returned datetime is shared between calls with the same string.
+    """
+    return to_eastern(parse_utc_epoch(date_string))
+
+
+def parse_epochs(date_strings, invalid=None):
+    """
+    Vectorized parse_epoch for a column of dates. The dates in the DJN format
+    are converted with numpy all at once, the others one by one.
+
+    Arguments:
+        date_strings: A sequence of date strings.
+        invalid: If not None, the value given to dates that do not parse,
+            instead of raising.
+
+    Returns:
+        A float64 numpy array of the seconds since the epoch of each date.
+    """
+    encoded = [s.encode("ascii", "replace") for s in date_strings]
+    raw = np.array(encoded, dtype="S%d" % DJN_LENGTH)
+    epochs = np.zeros(len(encoded))
+    if len(encoded) == 0:
+        return epochs
+    chars = raw.view(np.uint8).reshape(len(encoded), DJN_LENGTH).astype(np.int64)
+    digits = chars[:, DIGITS] - ord("0")
+    fast = (np.array([len(s) == DJN_LENGTH for s in encoded]) & (digits >= 0).all(axis=1) &
+        (digits <= 9).all(axis=1) & (chars[:, 8] == ord("T")) & (chars[:, 15] == ord("Z")))
+    year = digits[:, 0] * 1000 + digits[:, 1] * 100 + digits[:, 2] * 10 + digits[:, 3]
+    month = digits[:, 4] * 10 + digits[:, 5]
+    day = digits[:, 6] * 10 + digits[:, 7]
+    hour = digits[:, 8] * 10 + digits[:, 9]
+    minute = digits[:, 10] * 10 + digits[:, 11]
+    second = digits[:, 12] * 10 + digits[:, 13]
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    valid_month = (month >= 1) & (month <= 12)
+    month_days = DAYS_IN_MONTH[np.where(valid_month, month, 0)] - ((month == 2) & ~leap)
+    fast &= (year >= 1) & valid_month & (day >= 1) & (day <= month_days) & (hour < 24) & (minute < 60) & (second < 60)
+
+    # Days since the epoch of a proleptic Gregorian date (civil calendar).
+    y = year - (month <= 2)
+    era = np.floor_divide(y, 400)
+    year_of_era = y - era * 400
+    day_of_year = (153 * (month + np.where(month > 2, -3, 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    days = era * 146097 + day_of_era - 719468
+    epochs[fast] = (days * 86400 + hour * 3600 + minute * 60 + second)[fast]
+    for i in np.flatnonzero(~fast):
+        try:
+            epochs[i] = parse_epoch(date_strings[i])
+        except (ValueError, OverflowError, TypeError):
+            if invalid is None:
+                raise
+            epochs[i] = invalid
+    return epochs
@@ -0,0 +1,128 @@
+import re
+
+from nltk.tokenize import NLTKWordTokenizer
+
+try:
+    from nltk.tokenize.punkt import PunktTokenizer
+except ImportError:  # nltk < 3.8.2 ships the pickled models only
+    PunktTokenizer = None
+
+CACHE_SIZE = 1 << 18
+
+# A chunk is a run of non-whitespace with the whitespace before it.
+CHUNK = re.compile(r"(\s*)(\S+)")
+# Chunks made only of closing brackets and quotes, which the final period rule
+# of the treebank tokenizer reaches across (with the spaces between them).
+CLOSERS = re.compile("[\\]\\)}>\"'»”’]+\\Z")
+# Stands for the neighbouring chunks, so that the rules that look one
+# character past a chunk see the same whitespace as in the whole sentence.
+SENTINEL = "X"
+
+
+def _memoize(function, cache_size=CACHE_SIZE):
+    """Returns function of one hashable argument, with a bounded cache."""
+    cache = dict()
+
+    def memoized(argument):
+        value = cache.get(argument)
+        if value is None:
+            if len(cache) >= cache_size:
+                cache.clear()
+            value = cache[argument] = function(argument)
+        return value
+    return memoized
+
+
+def _load_punkt(language):
+    if PunktTokenizer is not None:
+        return PunktTokenizer(language)
+    from nltk import data
+    return data.load("tokenizers/punkt/{0}.pickle".format(language))
+
+
+class FastWordTokenizer:
+    """
+    Same tokens as nltk.tokenize.word_tokenize, computed once per distinct
+    word rather than once per occurrence.
+
+    word_tokenize splits the text into sentences with punkt, then runs the
+    treebank regexes over each whole sentence. Here punkt remembers its
+    decision for each potential sentence end (the word before, the punctuation
+    and the word after), and each sentence is cut at its whitespace into
+    chunks. Every treebank rule looks at most one character past a chunk, so a
+    chunk is tokenized by the same NLTKWordTokenizer with a sentinel for its
+    neighbours, and the tokens are cached by the chunk and the whitespace
+    around it. The first chunk of a sentence has no sentinel before it (for
+    the rules anchored at the start), and the end of the sentence, where the
+    final period rule may span several chunks, is tokenized as a whole.
+    """
+
+    def __init__(self, language="english", cache_size=CACHE_SIZE):
+        self.sentences = _load_punkt(language)
+        self.sentences.text_contains_sentbreak = _memoize(self.sentences.text_contains_sentbreak, cache_size)
+        self.words = NLTKWordTokenizer()
+        self.cache_size = cache_size
+        self.cache = dict()
+
+    def _tokens(self, key):
+        """
+        Returns the tokens of a chunk (or of the end of a sentence).
+
+        Arguments:
+            key: (text, whitespace before or None at the start of the sentence,
+                whitespace after or None at its end).
+        """
+        tokens = self.cache.get(key)
+        if tokens is None:
+            text, before, after = key
+            prefix = "" if before is None else SENTINEL + before
+            suffix = "" if after is None else after + SENTINEL
+            tokens = self.words.tokenize(prefix + text + suffix)
+            tokens = tokens[bool(prefix):len(tokens) - bool(suffix)]
+            if len(self.cache) >= self.cache_size:
+                self.cache.clear()
+            self.cache[key] = tokens
+        return tokens
+
+    def sentence(self, sentence):
+        """Same as NLTKWordTokenizer().tokenize(sentence)."""
+        chunks = CHUNK.findall(sentence)
+        tail = len(chunks) - 1
+        while tail > 0 and CLOSERS.match(chunks[tail][1]):
+            tail -= 1
+        tokens = []
+        for i in range(tail):
+            space, chunk = chunks[i]
+            tokens += self._tokens((chunk, space[-1] if space else None, chunks[i + 1][0][0]))
+        if chunks:
+            space = chunks[tail][0]
+            start = sum(len(s) + len(c) for s, c in chunks[:tail]) + len(space)
+            tokens += self._tokens((sentence[start:], space[-1] if space else None, None))
+        return tokens
+
+    def tokenize(self, text):
+        """
+        Arguments:
+            text: The text of an article.
+
+        Returns:
+            The list of tokens of text, the same as word_tokenize(text).
+        """
+        tokens = []
+        for sentence in self.sentences.tokenize(text):
+            tokens += self.sentence(sentence)
+        return tokens
+
+
+_tokenizers = dict()
+
+
+def word_tokenize(text, language="english"):
+    """
+    Drop-in replacement for nltk.tokenize.word_tokenize (without
+    preserve_line), sharing one FastWordTokenizer per language.
+    """
+    tokenizer = _tokenizers.get(language)
+    if tokenizer is None:
+        tokenizer = _tokenizers[language] = FastWordTokenizer(language)
+    return tokenizer.tokenize(text)
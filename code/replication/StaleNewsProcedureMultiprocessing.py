@@ -32,11 +32,9 @@ are considered in chronological order.
 import xml.etree.ElementTree as ET
 import re
 from nltk.corpus import stopwords 
-from nltk.tokenize import word_tokenize
 import nltk
 from nltk.stem.porter import *
 from pytz import timezone
-import dateutil.parser
 import datetime
 import heapq
 import numpy as np
@@ -48,6 +46,14 @@ from multiprocessing import Process, Queue, Pipe, cpu_count
 
 import glob
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'object'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'measures'))
+from NMLReader import docSlices, docGetter, chainGetter, nmlFiles
+from FieldExtractor import extract
+from StemTable import loadStemTable
+from timestamps import parse_epoch
+from tokenizer import word_tokenize
+
 fs = glob.glob('data/*.nml')
 eastern = timezone('US/Eastern')
 stop_words = set(stopwords.words('english')) 
@@ -62,13 +68,8 @@ def xmlTreeGetter(filename):
 	next article. The files are split by the </doc> tag, which is at the end 
 	of every article.
 	'''
-	nmlFile = open(filename)
-	text = ""
-	for line in nmlFile:
-		text += line
-		if "</doc>" in line:
-			yield ET.fromstring(text)
-			text = ""
+	for doc in docSlices(filename):
+		yield ET.fromstring(doc)
 
 
 def article(etree):
@@ -200,24 +201,34 @@ def staleNewsProcedure(ticker, story, companies, simtest):
 
 
 class Story:
-	'''A story class. Contains all of the information useful from each story.'''
-	accessionNumber = 0
-	displayDate = 0
-	tickers = []
-	headline = ""
-	text = "";
-	textWords = set()
-	sim = -1
-	def __init__(self, et=None):
-		self.accessionNumber = accessionNum(et)
-		self.displayDate = dateutil.parser.parse(displayDate(et)).timestamp()
-		self.tickers = tickercreator(et)
-		self.text = article(et)
-		self.textWords = stop(stem(word_tokenize(article(et))))
-		self.headline = headline(et)
+	'''
+	A story class. Contains all of the information useful from each story, in 
+	slots. The headline and text are only kept with keep_text, the procedure 
+	only compares the textWords.
+	'''
+	__slots__ = ("accessionNumber", "displayDate", "tickers", "headline", "text", "textWords", "sim")
+	def __init__(self, doc=None, keep_text=False):
+		self.accessionNumber = 0
+		self.displayDate = 0
+		self.tickers = []
+		self.headline = ""
+		self.text = ""
+		self.textWords = set()
+		self.sim = -1
+		try:
+			fields = extract(doc)
+		except:
+			fields = None # Articles that do not parse are skipped like those without tickers.
+		if fields is None:
+			return
+		self.accessionNumber, date, self.tickers, headline, text = fields
+		self.displayDate = parse_epoch(date)
+		self.textWords = stop(stem(word_tokenize(text)))
+		if keep_text:
+			self.headline, self.text = headline, text
 
 	def from_other(self, number, date, tick, txt, s):
-		self.acessionNumber = number
+		self.accessionNumber = number
 		self.displayDate = date
 		self.tickers = tick
 		self.text = txt
@@ -286,16 +297,18 @@ def processor(q, simtest, temp_save):
 			writer.writerow(p)
 
 
-def supplier(pipe, Story):
+def supplier(pipe, Story, keep_text=False):
 	"""
-	Worker that cleanes stories.
+	Worker that cleanes stories. Receives the raw bytes of an article and 
+	extracts its fields here, so the parent never decodes the XML. The text 
+	is dropped unless keep_text.
 	"""
 	while True:
-		et = pipe.recv()
-		if et == "ad mortem":
+		et = pipe.recv_bytes()
+		if et == b"ad mortem":
 			break
 		else:
-			pipe.send(Story(et))
+			pipe.send(Story(et, keep_text))
 
 
 def merge(endlocation, temp_files):
@@ -326,7 +339,7 @@ def merge(endlocation, temp_files):
 	[os.remove(file) for file in temp_files]
 
 
-def worker_init(count, t, simtest=None):
+def worker_init(count, t, simtest=None, keep_text=False):
 	"""
 	starts up the worker processes.
 	"""
@@ -334,7 +347,7 @@ def worker_init(count, t, simtest=None):
 	for i in range(count):
 		if t == "supplier":
 			a, b = Pipe()
-			worker = Process(target=supplier, args=((b), (Story)))
+			worker = Process(target=supplier, args=((b), (Story), (keep_text)))
 			worker.start()
 			workers.append(a)
 			worker_processes.append(worker)
@@ -348,10 +361,16 @@ def worker_init(count, t, simtest=None):
 	return workers, worker_processes
 
 
-def procedure(startlocation = 'data', endlocation='export_dataframe.csv', simtest=similaritytest, worker_count=-1):
+def procedure(startlocation = 'data', endlocation='export_dataframe.csv', simtest=similaritytest, worker_count=-1, stem_table=None, keep_text=False):
 	'''
 	Performs the procedure for the specified amount of articles. Uses 
 	all nml files from startlocation, and exports a csv file at endlocation.
+	Compressed nml files and tar archives are decompressed while they are read.
+	The articles of all the files are sent as one sequence, the next file being 
+	opened ahead by a thread, so the suppliers are only drained at the end.
+	A stem table (see object/StemTable.py) given as stem_table fills the stem 
+	cache before the suppliers are forked. The stories only keep their 
+	headline and text with keep_text.
 	'''
 
 	if worker_count < 0:
@@ -359,45 +378,51 @@ def procedure(startlocation = 'data', endlocation='export_dataframe.csv', simtes
 
 	worker_count = worker_count * 2
 
-	location = sorted(glob.glob(startlocation + '/*.nml'))
+	location = nmlFiles(startlocation)
+	if stem_table is not None:
+		wordDict.update(loadStemTable(stem_table))
 	companies = dict()
-	suppliers, supplier_processes = worker_init(worker_count, "supplier")
+	suppliers, supplier_processes = worker_init(worker_count, "supplier", keep_text=keep_text)
 	processors, processor_processes = worker_init(worker_count, "processor", simtest)
-	for f in location:
+
+	def opener(f):
 		print("File processing...",f)
-		xtg = xmlTreeGetter(f)
-		
+		return docGetter(f)
+	xtg = chainGetter(location, opener)
+
+	sent = 0
+	for supplier in suppliers:
+		try:
+			et = next(xtg)
+		except StopIteration:
+			break
+		supplier.send_bytes(et)
+		sent += 1
+
+	checks, load = len(suppliers) - sent, 0
+	while checks < len(suppliers):
 		for supplier in suppliers:
+			if checks >= len(suppliers):
+				break
+
+			story = supplier.recv() 
+
 			try:
 				et = next(xtg)
-			except:
-				continue
-			supplier.send(et)
-
-		checks, load = 0, 0
-		while checks < len(suppliers):
-			for supplier in suppliers:
-				if checks >= len(suppliers):
-					break
-
-				story = supplier.recv() 
-
-				try:
-					et = next(xtg)
-					supplier.send(et)
-				except:
-					checks += 1
-				
-				if not (story.tickers == []):
-					for ticker in story.tickers:
-						if '.' in ticker:
-							continue
-						if ticker not in companies:
-							companies[ticker] = load
-							load = (load + 1) % worker_count
-						processors[companies[ticker]].put((story, ticker))
-
-	[a.send("ad mortem") for a in suppliers]
+				supplier.send_bytes(et)
+			except StopIteration:
+				checks += 1
+			
+			if not (story.tickers == []):
+				for ticker in story.tickers:
+					if '.' in ticker:
+						continue
+					if ticker not in companies:
+						companies[ticker] = load
+						load = (load + 1) % worker_count
+					processors[companies[ticker]].put((story, ticker))
+
+	[a.send_bytes(b"ad mortem") for a in suppliers]
 	[w.join() for w in supplier_processes]
 
 	[q.put((None, "ad mortem")) for q in processors]
@@ -13,10 +13,15 @@ import argparse
 import csv
 
 sys.path.append("../measures")
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "object"))
 from measure_constants import MeasureConstants
 from article import Article
 from bow_similarity import BOWSimilarity
 from cosine_similarity import CosineSimilarity
+from NMLReader import docGetter, nmlFiles
+from FieldExtractor import extractHeader
+from DocFilter import DocFilter, DATE, NO_TICKERS, TICKER
+from timestamps import parse_utc_epoch
 
 sim = BOWSimilarity()
 
@@ -52,12 +57,14 @@ def filter_old_articles(company_article_map, curr_article, k_hours=sim.measure_c
     return company_article_set  
 
 
-def create_article_map(directory_path, output_csv_name, k_hours=sim.measure_const.NUM_HOURS):
+def create_article_map(directory_path, output_csv_name, k_hours=sim.measure_const.NUM_HOURS,
+                       tickers=None, start_date=None, end_date=None):
     """
     Main parsing function. Takes in a directory containing .nml files
     and returns a dictionary with keys that correspond to company symbols,
     and values that are sets of Article objects whose articles are about
-    that company. 
+    that company. The .nml files may also be compressed (.nml.gz, .nml.bz2,
+    .nml.xz) or held in tar archives.
     
     Arguments:
         directory_path: A string representing the filepath for directory containing .nml files to parse. 
@@ -67,6 +74,13 @@ def create_article_map(directory_path, output_csv_name, k_hours=sim.measure_cons
             article filtering. Default is 72, so articles mapped to any
             given company which are at least 72 hours older than the
             current article being parsed will be filtered from the map.
+        tickers: If not None, the only company symbols to keep.
+        start_date, end_date: If not None, only articles displayed from start_date
+            (included) to end_date (excluded) get rows, as epochs or date strings
+            (UTC). The articles of the k_hours before start_date are only added
+            to the map. Articles out of the range, or without any of tickers,
+            are rejected from the head of the article, before it is parsed;
+            those whose head can not be read are checked after the parse.
     
     Returns:
         company_article_map: Map from companies to sets of Articles about
@@ -74,7 +88,6 @@ def create_article_map(directory_path, output_csv_name, k_hours=sim.measure_cons
             were published within k_hours hours of each other. 
     """
     company_article_map = {}
-    curr_file_str = ""
 
     header_df = pd.DataFrame(columns=["company", "headline", "time", "id",
                                      "old_score", "closest_neighbor", "is_reprint", "is_recombination",
@@ -87,64 +100,78 @@ def create_article_map(directory_path, output_csv_name, k_hours=sim.measure_cons
     f = open(output_csv_name, "a")
     csv_writer = csv.writer(f)
 
-    directory = os.fsencode(directory_path)
-    
-    nml_files = []
-    for file in os.listdir(directory):
-        filename = os.fsdecode(file)
-        if ".nml" not in filename:
-            continue
-        else:
-            nml_files.append(directory_path + filename)
-
-
-    for filename in sorted(nml_files):
-        with open(filename) as myfile:
-            for next_line in myfile:
-                curr_file_str += next_line
-                if next_line == "</doc>\n":
-
-                    xml_elem = ET.fromstring(curr_file_str)
-                    company = xml_elem.find(".//djn-company-sig")
-                    if company is None:
-                        curr_file_str = ""
-                        continue
-
-                    md5_hash = xml_elem.attrib['md5']
-                    timestamp = xml_elem.find(".//djn-mdata").attrib['display-date']
-                    headline = xml_elem.find(".//headline").text.lstrip()
-                    all_text = xml_elem.find(".//text")
-                    article_text = "".join(all_text.itertext())
-                    text_stemmed_filtered = sim.stem_and_filter(article_text)
-                    num_unique_words = len(text_stemmed_filtered)
-
-                    for c in company:
-                        if c.attrib.get('about', False) != 'Y' or "." in c.text:
-                            curr_file_str = ""
-                            continue
-                        company = c.text
-
-                        new_article = Article(company, timestamp, headline, text_stemmed_filtered, md5_hash)
-                        company_articles = filter_old_articles(company_article_map, new_article, k_hours)
-                        
-                        if len(company_articles) == 0:
-                            company_articles.add(new_article)
-                            company_article_map[company] = company_articles
-                            curr_file_str = ""
-                            continue
-                        else:
-                            old, closest_neighbor, closest_id = sim.compute_sim_measure(new_article, company_articles)
-                            new_row = [new_article.timestamp, new_article.md5_id, new_article.company, new_article.headline,
-                                       num_unique_words, closest_id, closest_neighbor, old, sim.is_old_news(old),
-                                       sim.is_reprint(old, closest_neighbor), sim.is_recombination(old, closest_neighbor)]
-                            csv_writer.writerow(new_row)
-
-                            company_articles.add(new_article)
-                            company_article_map[company] = company_articles
-                            
-                        curr_file_str = ""
+    doc_filter = DocFilter(tickers, start_date, end_date, k_hours * 60 * 60)
+    filter_dates = doc_filter.start is not None or doc_filter.end is not None
+
+    for filename in nmlFiles(directory_path):
+        for doc in docGetter(filename):
+            date = None
+            if filter_dates or doc_filter.tickers is not None:
+                try:
+                    _, display_date, header_tickers = extractHeader(doc)
+                except Exception:
+                    display_date, header_tickers = None, None # Left to the full parse
+                if header_tickers is not None and not any(doc_filter.allowed(t) for t in header_tickers):
+                    doc_filter.count("header", TICKER if header_tickers else NO_TICKERS)
+                    continue
+                if filter_dates and display_date is not None:
+                    try:
+                        date = parse_utc_epoch(display_date)
+                    except Exception:
+                        pass # Left to the full parse
+                if date is not None and not doc_filter.inRange(date):
+                    doc_filter.count("header", DATE)
+                    continue
+
+            xml_elem = ET.fromstring(doc)
+            company = xml_elem.find(".//djn-company-sig")
+            if company is None:
+                doc_filter.count("company-sig", NO_TICKERS)
+                continue
+            symbols = [c.text for c in company if c.attrib.get('about', False) == 'Y' and "." not in c.text]
+            if not any(doc_filter.allowed(symbol) for symbol in symbols):
+                doc_filter.count("company-sig", TICKER if symbols else NO_TICKERS)
+                continue
+
+            md5_hash = xml_elem.attrib['md5']
+            timestamp = xml_elem.find(".//djn-mdata").attrib['display-date']
+            if filter_dates and date is None: # The header did not give it
+                date = parse_utc_epoch(timestamp)
+                if not doc_filter.inRange(date):
+                    doc_filter.count("company-sig", DATE)
+                    continue
+            warmup = date is not None and doc_filter.isWarmup(date)
+            headline = xml_elem.find(".//headline").text.lstrip()
+            all_text = xml_elem.find(".//text")
+            article_text = "".join(all_text.itertext())
+            text_stemmed_filtered = sim.stem_and_filter(article_text)
+            num_unique_words = len(text_stemmed_filtered)
+
+            for c in company:
+                if c.attrib.get('about', False) != 'Y' or "." in c.text or not doc_filter.allowed(c.text):
+                    continue
+                company = c.text
+
+                new_article = Article(company, timestamp, headline, text_stemmed_filtered, md5_hash)
+                company_articles = filter_old_articles(company_article_map, new_article, k_hours)
+                
+                if len(company_articles) == 0 or warmup:
+                    company_articles.add(new_article)
+                    company_article_map[company] = company_articles
+                    continue
+                else:
+                    old, closest_neighbor, closest_id = sim.compute_sim_measure(new_article, company_articles)
+                    new_row = [new_article.timestamp, new_article.md5_id, new_article.company, new_article.headline,
+                               num_unique_words, closest_id, closest_neighbor, old, sim.is_old_news(old),
+                               sim.is_reprint(old, closest_neighbor), sim.is_recombination(old, closest_neighbor)]
+                    csv_writer.writerow(new_row)
+
+                    company_articles.add(new_article)
+                    company_article_map[company] = company_articles
+                    
     
     f.close()
+    print(doc_filter.report())
     return company_article_map
 
 
@@ -153,10 +180,18 @@ def create_article_map(directory_path, output_csv_name, k_hours=sim.measure_cons
 arg_parser = argparse.ArgumentParser()
 arg_parser.add_argument("dir_path", help = "filepath to directory containing .nml files to be parsed")
 arg_parser.add_argument("csv_name", help = "name of .csv file you want to output")
+arg_parser.add_argument("--tickers", help = "file with the company symbols to keep, one per line")
+arg_parser.add_argument("--start", help = "first display date to keep, e.g. 2001-01-01")
+arg_parser.add_argument("--end", help = "display date to stop at (excluded)")
 if len(sys.argv) < 1:
     arg_parser.print_help(sys.stderr)
 args = arg_parser.parse_args()
-article_map = create_article_map(args.dir_path, args.csv_name)
+allowed = None
+if args.tickers:
+    with open(args.tickers) as ticker_file:
+        allowed = ticker_file.read().split()
+article_map = create_article_map(args.dir_path, args.csv_name, tickers=allowed,
+                                 start_date=args.start, end_date=args.end)
 print("Parsing done!")
 
 end = timer()
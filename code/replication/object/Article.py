@@ -4,33 +4,111 @@ This file contains the base article class.
 Christopher Gong, Jonathan Bodine
 """
 
-import dateutil.parser
-import xml.etree.ElementTree as ET
+import os
+import sys
 
-from ETUtils import *
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "measures"))
+from timestamps import parse_epoch
+from FieldExtractor import extract
+from DocFilter import NO_TICKERS, UNPARSABLE
 
 class Article:
 	"""
 	Class that represents a generic article.
 	"""
 
-	def __init__(self, text):
+	def __init__(self, text, docFilter=None):
 		"""
-		Takes as input an XML string, and populates the features of an 
-		article. 
+		Takes as input an XML string or bytes, and populates the features of an 
+		article. Articles without tickers, or rejected by docFilter (see 
+		DocFilter), are rejected before any text is read, and only get an empty 
+		list of tickers and the reason they were skipped. With clusters (see 
+		DocFilter), those without tickers in range are read, with an empty list 
+		of tickers.
 		"""
+		self.skipped = None
+		self.warmup = False
 		try:
-			et = ET.fromstring(text) # Some articles do not parse correctly.
-			self.accessionNumber = accessionNum(et)
-			self.displayDate = dateutil.parser.parse(displayDate(et)).timestamp()
-			self.tickers = tickercreator(et)
-			self.text = article(et)
-			self.headline = headline(et)
+			if docFilter is not None:
+				docFilter.reason = None
+			fields = extract(text, docFilter and docFilter.screen, docFilter and docFilter.clusters and docFilter.screenUntagged) # Some articles do not parse correctly.
+			if fields is None:
+				self.tickers = []
+				self.bad = False
+				self.skipped = (docFilter and docFilter.reason) or NO_TICKERS
+				return
+			self.accessionNumber, date, self.tickers, self.headline, self.text = fields
+			self.displayDate = parse_epoch(date)
+			self.warmup = docFilter is not None and docFilter.isWarmup(self.displayDate)
 			self.bad = False
 		except:
 			self.bad = True
+			self.skipped = UNPARSABLE
 		
 
+	def record(self, keep_text=False):
+		"""
+		Returns the StoryRecord of a preprocessed article, with its headline and 
+		text only if keep_text.
+		"""
+		r = StoryRecord()
+		r.accessionNumber = self.accessionNumber
+		r.displayDate = self.displayDate
+		r.tickers = tuple(self.tickers)
+		r.warmup = self.warmup
+		r.pre = self.pre
+		r.norm = getattr(self, "norm", None)
+		r.weights = getattr(self, "weights", None)
+		r.bits = None
+		r.digest = getattr(self, "digest", None)
+		r.ids = None
+		r.sketch = None
+		r.cluster = None
+		r.headline = self.headline if keep_text else None
+		r.text = self.text if keep_text else None
+		return r
+
+	def __lt__(self, other):
+		"""
+		Used to break ties when ordering in a heap queue.
+		"""
+		return False
+
+
+class StoryRecord:
+	"""
+	The features of a preprocessed article that the procedure needs, in slots: 
+	accession number, display date, tickers, the preprocessing of the 
+	similarity test (pre, and norm, weights, bits or ids for some), the digest 
+	of its text (see Similarity.contentDigest), its sketch and cluster columns 
+	(see NearDuplicates), and the headline and text only when they are kept. 
+	This is what the suppliers send and the linked lists hold for the whole 
+	look back window. A numpy pre (see HashedBoWSimularity) or weights (see 
+	SparseCosineSimilarity) is pickled as its raw bytes.
+	"""
+
+	__slots__ = ("accessionNumber", "displayDate", "tickers", "warmup", "pre", "norm", "weights", "bits", "ids", "digest", "sketch", "cluster", "headline", "text")
+	bad = False
+	skipped = None
+
+	def __getstate__(self):
+		state = {name: getattr(self, name, None) for name in self.__slots__}
+		for name in ("pre", "weights"):
+			if isinstance(state[name], np.ndarray):
+				state[name] = (state[name].dtype.str, state[name].tobytes())
+		return tuple(state.values())
+
+	def __setstate__(self, state):
+		for name, value in zip(self.__slots__, state):
+			setattr(self, name, value)
+		for name in ("pre", "weights"):
+			value = getattr(self, name)
+			if isinstance(value, tuple):
+				dtype, raw = value
+				setattr(self, name, np.frombuffer(raw, dtype=dtype))
+
 	def __lt__(self, other):
 		"""
 		Used to break ties when ordering in a heap queue.
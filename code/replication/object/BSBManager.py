@@ -1,57 +1,162 @@
 from multiprocessing import Process, Queue, Pipe
 from Article import Article as Story
 import csv
+import mmap
 import os
 from LL import *
+from SlicePlanner import sliceGetter
 import heapq
 
-def processor(q, simObject, temp_save):
+def processor(q, simObject, temp_save, reports=None):
 	"""
-	Worker that will process a que of stories.
+	Worker that will process a que of stories. Warm-up stories are only added 
+	to the linked lists. Puts the report of simObject on reports, if given, 
+	when it is told to stop.
 	"""
 	with open(temp_save, 'w', newline='') as csvfile:
 		writer = csv.writer(csvfile, delimiter=',')
-		writer.writerow(['DATE_EST', 'STORY_ID', 'TICKER', 'STORY_LENGTH', 'CLOSEST_ID', 'SECOND_CLOSEST_ID', 'CLOSEST_SCORE', 'TOTAL_OVERLAP', 'IS_OLD', 'IS_REPRINT', 'IS_RECOMB'])
+		writer.writerow(simObject.header())
 		companies = dict()
 		while True:
 			story, ticker = q.get(block=True)
 			if ticker == "ad mortem":
+				if reports is not None:
+					reports.put(simObject.report())
 				break
 			if ticker not in companies:
-				companies[ticker] = myLinkedList()
+				companies[ticker] = simObject.newWindow()
+			if story.warmup:
+				companies[ticker].addFront(story)
+				continue
 			p = simObject.staleNewsProcedure(ticker, story, companies[ticker])
 			writer.writerow(p)
 
 
-def supplier(pipe, Story, simObject):
+def supplier(pipe, Story, simObject, docFilter=None, keep_text=False, index=None):
 	"""
-	Worker that cleanes stories.
+	Worker that cleanes stories, screened by docFilter if given. Preprocessed 
+	stories are sent back as their StoryRecord, without their text unless 
+	keep_text, and with their sketch for the near-duplicate index if given 
+	(see NearDuplicates). Sends back the report of simObject when it is told 
+	to stop.
 	"""
 	while True:
-		et = pipe.recv()
-		if et == "ad mortem":
+		et = pipe.recv_bytes()
+		if et == b"ad mortem":
+			pipe.send(simObject.report())
 			break
 		else:
-			s = Story(et)
-			simObject.preprocessing(s)
+			s = Story(et, docFilter)
+			if not s.bad and s.skipped is None:
+				simObject.preprocessing(s)
+				s = s.record(keep_text)
+				if index is not None:
+					s.sketch = index.sketch(simObject.terms(s))
 			pipe.send(s)
 
 
+def offsetSupplier(pipe, Story, simObject, docFilter=None, keep_text=False, index=None):
+	"""
+	Worker that reads and cleanes stories itself. Gets batches of (filename, 
+	offset, length) descriptors, or of raw articles for files that can not be 
+	mapped, and sends back the list of their stories (records, as in supplier) 
+	in the same order. The 
+	file being read is memory mapped once. Sends back the report of simObject 
+	when it is told to stop.
+	"""
+	current, mm = None, None
+	while True:
+		batch = pipe.recv()
+		if batch is None:
+			pipe.send(simObject.report())
+			break
+		stories = []
+		for item in batch:
+			if isinstance(item, bytes):
+				s = Story(item, docFilter)
+			else:
+				filename, offset, length = item
+				if filename != current:
+					if mm is not None:
+						mm.close()
+					with open(filename, 'rb') as nmlFile:
+						mm = mmap.mmap(nmlFile.fileno(), 0, access=mmap.ACCESS_READ)
+					current = filename
+				s = Story(mm[offset:offset + length], docFilter)
+			if not s.bad and s.skipped is None:
+				simObject.preprocessing(s)
+				s = s.record(keep_text)
+				if index is not None:
+					s.sketch = index.sketch(simObject.terms(s))
+			stories.append(s)
+		pipe.send(stories)
+	if mm is not None:
+		mm.close()
+
+
+def sliceWorker(task):
+	"""
+	Worker that runs one time slice of the corpus on its own. The warm-up 
+	articles (the first warm entries) are only added to the linked lists, the 
+	others are processed and written to temp_save in order. Returns the report 
+	of simObject.
+	"""
+	entries, warm, simObject, temp_save = task
+	companies = dict()
+	with open(temp_save, 'w', newline='') as csvfile:
+		writer = csv.writer(csvfile, delimiter=',')
+		writer.writerow(simObject.header())
+		for i, et in enumerate(sliceGetter(entries)):
+			story = Story(et)
+			if story.bad or story.tickers == []:
+				continue
+			simObject.preprocessing(story)
+			story = story.record()
+			for ticker in story.tickers:
+				if '.' in ticker:
+					continue
+				if ticker not in companies:
+					companies[ticker] = simObject.newWindow()
+				if i < warm:
+					companies[ticker].addFront(story)
+				else:
+					writer.writerow(simObject.staleNewsProcedure(ticker, story, companies[ticker]))
+	return simObject.report()
+
+
+def concatenate(endlocation, temp_files):
+	"""
+	Joins together the files of consecutive slices into one larger file, under 
+	the header of the first one. Deletes the temp_files after the join.
+	"""
+	with open(endlocation, 'w', newline='') as csvfile:
+		writer = csv.writer(csvfile, delimiter=',')
+		for i, file in enumerate(temp_files):
+			with open(file, 'r', newline='') as part:
+				reader = csv.reader(part, delimiter=',')
+				header = next(reader)
+				if i == 0:
+					writer.writerow(header)
+				writer.writerows(reader)
+	[os.remove(file) for file in temp_files]
+
+
 def merge(endlocation, temp_files):
 	"""
-	Merges together sorted files into one laregr file.  Deletes the temo_files
-	after the megre.
+	Merges together sorted files into one laregr file, under their header.  
+	Deletes the temo_files after the megre.
 	"""
 	files = [open(file, 'r') for file in temp_files]
 	filedata = {i: csv.reader(file, delimiter=',') for i, file in enumerate(files)}
 	temp = list()
 	for i in range(len(temp_files)):
-		next(filedata[i])
-		newline = next(filedata[i])
-		heapq.heappush(temp, (newline[0], i, newline))
+		header = next(filedata[i])
+		newline = next(filedata[i], None) # A worker may have written no rows
+		if newline:
+			heapq.heappush(temp, (newline[0], i, newline))
 	with open(endlocation, 'w', newline='') as csvfile:
 		writer = csv.writer(csvfile, delimiter=',')
-		writer.writerow(['DATE_EST', 'STORY_ID', 'TICKER', 'STORY_LENGTH', 'CLOSEST_ID', 'SECOND_CLOSEST_ID', 'CLOSEST_SCORE', 'TOTAL_OVERLAP', 'IS_OLD', 'IS_REPRINT', 'IS_RECOMB'])
+		writer.writerow(header)
 		while temp:
 			_, f, data = heapq.heappop(temp)
 			writer.writerow(data)
@@ -65,22 +170,23 @@ def merge(endlocation, temp_files):
 	[os.remove(file) for file in temp_files]
 
 
-def worker_init(count, t, simObject=None):
+def worker_init(count, t, simObject=None, docFilter=None, keep_text=False, reports=None, index=None):
 	"""
-	starts up the worker processes.
+	starts up the worker processes. Processors put their report on the 
+	reports queue, if given. Suppliers sketch the stories for index, if given.
 	"""
 	workers, worker_processes = list(), list()
 	for i in range(count):
-		if t == "supplier":
+		if t == "supplier" or t == "offsetSupplier":
 			a, b = Pipe()
-			worker = Process(target=supplier, args=((b), (Story), (simObject)))
+			worker = Process(target=supplier if t == "supplier" else offsetSupplier, args=((b), (Story), (simObject), (docFilter), (keep_text), (index)))
 			worker.start()
 			workers.append(a)
 			worker_processes.append(worker)
 		elif t == "processor":
 			temp_save = f"temp_file_{i}.csv"
 			queue = Queue()
-			worker = Process(target=processor, args=((queue), (simObject), (temp_save)))
+			worker = Process(target=processor, args=((queue), (simObject), (temp_save), (reports)))
 			worker_processes.append(worker)
 			worker.start()
 			workers.append(queue)
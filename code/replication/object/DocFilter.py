@@ -0,0 +1,144 @@
+"""
+Ticker allow-list and date range filter, applied before any body text is read.
+
+Articles are screened on their header metadata only: the index entries when
+there is an index, else the display-date and company codes scanned from the
+head of the article (see FieldExtractor.extract). With a date range, the
+articles of the look back window before its start are kept as warm-up, so the
+linked lists hold the same articles at the start of the range as in a run over
+the whole corpus. The number of articles skipped at each stage is counted for
+the run report. With clusters, every article of the range and its warm-up is
+read for the near-duplicate index (see NearDuplicates), with or without
+tickers, and the allow-list only selects the tickers sent to the processors
+(see narrow).
+"""
+
+import os
+import sys
+from collections import Counter
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "measures"))
+from timestamps import parse_epoch, parse_utc_epoch
+
+NO_TICKERS = "no tickers"
+TICKER = "ticker filter"
+DATE = "date filter"
+UNPARSABLE = "unparsable"
+
+
+def toEpoch(date):
+	'''Returns seconds since the epoch for a number or a date string (taken as UTC).'''
+	if date is None or isinstance(date, (int, float)):
+		return date
+	return parse_utc_epoch(date)
+
+
+class DocFilter:
+	"""
+	Keeps the articles about the tickers of an allow-list (all tickers if None)
+	displayed from start (included) to end (excluded), either one being an
+	epoch, a date string or None for no bound. Also keeps the articles of the
+	look_back seconds before start, marked as warm-up. With clusters, keeps
+	every article displayed within these dates, whatever its tickers.
+	"""
+
+	def __init__(self, tickers=None, start=None, end=None, look_back=0, clusters=False):
+		self.tickers = None if tickers is None else set(tickers)
+		self.start = toEpoch(start)
+		self.end = toEpoch(end)
+		self.look_back = look_back
+		self.clusters = clusters
+		self.reason = None
+		self.counts = Counter()
+
+	def inRange(self, date):
+		'''
+		Returns True if an article displayed at date (epoch) is in the range or
+		its warm-up. Sets reason otherwise.
+		'''
+		if (self.start is not None and date < self.start - self.look_back) or (self.end is not None and date >= self.end):
+			self.reason = DATE
+			return False
+		return True
+
+	def allowed(self, ticker):
+		'''Returns True if ticker is in the allow-list.'''
+		return self.tickers is None or ticker in self.tickers
+
+	def keep(self, date, tickers):
+		'''
+		Returns the tickers of an article, displayed at date (epoch), that pass
+		the filter: none if the date is out of range. Sets reason to why an
+		article with tickers is rejected. With clusters, the tickers are only
+		narrowed to the allow-list later (see narrow).
+		'''
+		if not self.inRange(date):
+			return []
+		if self.clusters:
+			return tickers
+		kept = tickers if self.tickers is None else [t for t in tickers if t in self.tickers]
+		if not kept:
+			self.reason = TICKER
+		return kept
+
+	def screen(self, date, tickers):
+		'''The keep function for FieldExtractor.extract, given the date as written.'''
+		return self.keep(parse_epoch(date), tickers)
+
+	def screenUntagged(self, date):
+		'''
+		The untagged function for FieldExtractor.extract with clusters, given
+		the date as written. Articles without tickers are counted as such, in
+		range or not.
+		'''
+		kept = self.inRange(parse_epoch(date))
+		self.reason = None
+		return kept
+
+	def narrow(self, tickers, stage):
+		'''
+		Returns the tickers of a kept article that go to the processors, those
+		of the allow-list with clusters (the others already are), and counts
+		the article at stage if there are none.
+		'''
+		if not self.clusters:
+			return tickers
+		kept = [t for t in tickers if self.allowed(t)]
+		if not kept:
+			self.count(stage, TICKER if tickers else NO_TICKERS)
+		return kept
+
+	def isWarmup(self, date):
+		'''Returns True if an article displayed at date only warms up the linked lists.'''
+		return self.start is not None and date < self.start
+
+	def entries(self, entries):
+		'''
+		Returns the index entries that pass the filter, with their tickers
+		narrowed to the allow-list, and counts the others. With clusters, all
+		the entries in range are kept as they are.
+		'''
+		kept = []
+		for e in entries:
+			if self.clusters and e.date is not None and self.inRange(e.date):
+				kept.append(e)
+				continue
+			if not e.tickers or e.date is None:
+				self.count("index", NO_TICKERS if e.date is not None else UNPARSABLE)
+				continue
+			tickers = self.keep(e.date, e.tickers)
+			if tickers:
+				kept.append(e._replace(tickers=tickers))
+			else:
+				self.count("index", self.reason)
+		return kept
+
+	def count(self, stage, reason, n=1):
+		self.counts[(stage, reason)] += n
+
+	def report(self):
+		'''Returns the number of articles skipped at each stage, one line per stage.'''
+		stages = dict()
+		for (stage, reason), n in sorted(self.counts.items()):
+			stages.setdefault(stage, []).append(f"{reason}: {n}")
+		return "\n".join(f"Skipped at {stage}... " + ", ".join(reasons) for stage, reasons in stages.items())
@@ -0,0 +1,220 @@
+"""
+Single pass extraction of the fields the procedure uses from an article.
+
+Instead of building a full ElementTree and walking the long find() chains of
+ETUtils, the raw bytes are scanned once, front to back, for the md5, the
+display-date, the djn-company codes, the headline and the body text. The
+company codes are read first and articles without any are rejected before
+the body is looked at. Articles with a layout the scanner does not handle
+(nested tags in the text, unknown entities, other encodings, ...) are parsed
+with ElementTree and the ETUtils getters instead, so the results are the same.
+The scanner does not validate the parts of the XML it skips.
+"""
+
+import re
+import xml.etree.ElementTree as ET
+
+from ETUtils import accessionNum, displayDate, tickercreator, headline, article
+
+_ATTRS = rb'((?:\s+[\w.:-]+\s*=\s*(?:"[^"]*"|\'[^\']*\'))*)\s*'
+_NAME_END = rb'(?=[\s/>])'
+MD5 = re.compile(rb'md5\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+DISPLAY_DATE = re.compile(rb'display-date\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+ROOT = re.compile(rb'\s*(?:<\?xml(?P<decl>[^>]*)\?>)?\s*<doc' + _ATTRS + rb'>')
+ENCODING = re.compile(rb'encoding\s*=\s*["\']([\w.:-]+)["\']')
+MDATA = re.compile(rb'<djn-mdata' + _NAME_END)
+HEAD_END = re.compile(rb'</head\s*>')
+COMPANY = re.compile(rb'<djn-company' + _NAME_END)
+COMPANY_END = re.compile(rb'</djn-company\s*>')
+HEADLINE = re.compile(rb'<headline' + _NAME_END)
+TEXT = re.compile(rb'<text' + _NAME_END)
+TEXT_END = re.compile(rb'</text\s*>')
+OPEN = re.compile(rb'<[\w.:-]+([^<>]*)>')
+HEADLINE_BODY = re.compile(rb'([^<]*)</headline\s*>')
+CHILD = re.compile(r'[^<]*<([\w.:-]+)' + _ATTRS.decode() + r'>([^<]*)</\1\s*>')
+ENTITY = re.compile(r'&(#x[0-9a-fA-F]+|#[0-9]+|lt|gt|amp|quot|apos);')
+BAD_AMP = re.compile(r'&(?!(?:#x[0-9a-fA-F]+|#[0-9]+|lt|gt|amp|quot|apos);)')
+BAD_ATTR = re.compile(rb'[&<\t\r\n]')
+
+ENCODINGS = {"utf-8": "utf-8", "utf8": "utf-8", "iso-8859-1": "latin-1", "iso8859-1": "latin-1",
+	"latin-1": "latin-1", "latin1": "latin-1", "us-ascii": "ascii", "ascii": "ascii"}
+NAMED = {"lt": "<", "gt": ">", "amp": "&", "quot": '"', "apos": "'"}
+
+
+class _Unhandled(Exception):
+	'''Raised when an article has to go through ElementTree.'''
+
+
+def _entity(match):
+	name = match.group(1)
+	if name[0] != "#":
+		return NAMED[name]
+	return chr(int(name[2:], 16) if name[1] == "x" else int(name[1:]))
+
+
+def _text(s):
+	'''Turns decoded character data into text the way the XML parser would.'''
+	if "\r" in s:
+		s = s.replace("\r\n", "\n").replace("\r", "\n")
+	if "&" in s:
+		if BAD_AMP.search(s):
+			raise _Unhandled
+		s = ENTITY.sub(_entity, s)
+	return s
+
+
+def _attr(attrs, pattern, encoding):
+	'''Returns the attribute matched by pattern from the attribute bytes of a tag.'''
+	m = pattern.search(attrs)
+	if m is None or not attrs[m.start() - 1:m.start()].isspace():
+		raise _Unhandled
+	value = m.group(1) if m.group(1) is not None else m.group(2)
+	if BAD_ATTR.search(value):
+		raise _Unhandled
+	return value.decode(encoding)
+
+
+def _open(pattern, raw, pos, endpos):
+	'''
+	Finds the first tag matched by pattern between pos and endpos, returns its
+	match from OPEN (group 1 holds the attributes, ending with "/" for an empty
+	element), or None if there is no such tag.
+	'''
+	m = pattern.search(raw, pos, endpos)
+	if m is None:
+		return None
+	tag = OPEN.match(raw, m.start(), endpos)
+	if tag is None or tag.group(1).count(b'"') % 2 or tag.group(1).count(b"'") % 2:
+		raise _Unhandled # A quoted ">" in an attribute, or worse.
+	return tag
+
+
+def _children(raw, start, end, encoding):
+	'''
+	Returns the text of each child element between start and end. Children
+	must be leaf elements with some text, as the getters in ETUtils require.
+	Text outside of the children is ignored, as it is by those getters.
+	'''
+	region = str(raw[start:end], encoding)
+	if "&" in region and BAD_AMP.search(region):
+		raise _Unhandled
+	texts = []
+	pos = 0
+	for m in CHILD.finditer(region):
+		if m.start() != pos or not m.group(3):
+			raise _Unhandled
+		texts.append(m.group(3))
+		pos = m.end()
+	if "<" in region[pos:]:
+		raise _Unhandled
+	return texts
+
+
+def _header(doc):
+	'''
+	Scans the head of an article. Returns the bytes, their encoding, the end of
+	the head, the md5, the display date and the tickers (empty without company
+	codes). Raises _Unhandled for anything unusual.
+	'''
+	if isinstance(doc, str):
+		raw, encoding = doc.encode("utf-8"), "utf-8"
+	else:
+		raw, encoding = doc, None
+	root = ROOT.match(raw)
+	if root is None:
+		raise _Unhandled
+	if encoding is None:
+		decl = ENCODING.search(root.group("decl") or b"")
+		name = decl.group(1).decode("ascii").lower() if decl else "utf-8"
+		if name not in ENCODINGS:
+			raise _Unhandled
+		encoding = ENCODINGS[name]
+	md5 = _attr(root.group(2), MD5, encoding)
+
+	headEnd = HEAD_END.search(raw, root.end())
+	if headEnd is None:
+		raise _Unhandled
+	mdata = _open(MDATA, raw, root.end(), headEnd.start())
+	if mdata is None:
+		raise _Unhandled
+	date = _attr(mdata.group(1), DISPLAY_DATE, encoding)
+	tickers = []
+	company = _open(COMPANY, raw, mdata.end(), headEnd.start())
+	if company is not None and not company.group(1).endswith(b"/"):
+		companyEnd = COMPANY_END.search(raw, company.end(), headEnd.start())
+		if companyEnd is None:
+			raise _Unhandled
+		tickers = [_text(t) for t in _children(raw, company.end(), companyEnd.start(), encoding)]
+	return raw, encoding, headEnd.end(), md5, date, tickers
+
+
+def _body(raw, encoding, start):
+	'''Scans the body of an article from start, returns its headline and text.'''
+	head = _open(HEADLINE, raw, start, len(raw))
+	if head is None:
+		raise _Unhandled
+	title = None
+	if not head.group(1).endswith(b"/"):
+		m = HEADLINE_BODY.match(raw, head.end())
+		if m is None:
+			raise _Unhandled
+		title = _text(m.group(1).decode(encoding)) if m.group(1) else None
+	text = ""
+	body = _open(TEXT, raw, start, len(raw))
+	if body is not None and not body.group(1).endswith(b"/"):
+		bodyEnd = TEXT_END.search(raw, body.end())
+		if bodyEnd is None:
+			raise _Unhandled
+		text = _text("".join(_children(raw, body.end(), bodyEnd.start(), encoding)))
+	return title, text
+
+
+def parseFields(doc, untagged=None):
+	'''
+	The ElementTree version of extract, used as the fall back.
+	'''
+	et = ET.fromstring(doc)
+	tickers = tickercreator(et)
+	if tickers == [] and not (untagged and untagged(displayDate(et))):
+		return None
+	return accessionNum(et), displayDate(et), tickers, headline(et), article(et)
+
+
+def extract(doc, keep=None, untagged=None):
+	'''
+	Given an article as a string, bytes or memoryview, returns (md5, display
+	date, tickers, headline, text), or None for articles without company codes,
+	whose body is never read. Raises like ElementTree does for articles that
+	do not parse. keep, if given, is called with the display date and the
+	tickers of articles that have some, and returns the tickers to keep; the
+	body of the article is only read if it keeps any. untagged, if given, is
+	called with the display date of articles without company codes, and
+	returns whether to read them anyway, with an empty list of tickers.
+	'''
+	try:
+		raw, encoding, start, md5, date, tickers = _header(doc)
+		if tickers and keep is not None:
+			tickers = keep(date, tickers)
+		elif not tickers and untagged and untagged(date):
+			return (md5, date, []) + _body(raw, encoding, start)
+		if tickers == []:
+			return None
+		return (md5, date, tickers) + _body(raw, encoding, start)
+	except (_Unhandled, UnicodeDecodeError, ValueError):
+		fields = parseFields(doc, untagged)
+		if fields is None or keep is None or not fields[2]:
+			return fields
+		tickers = keep(fields[1], fields[2])
+		return fields[:2] + (tickers,) + fields[3:] if tickers else None
+
+
+def extractHeader(doc):
+	'''
+	Given an article, returns (md5, display date, tickers) without reading the
+	body. Articles without company codes get an empty ticker list.
+	'''
+	try:
+		return _header(doc)[3:]
+	except (_Unhandled, UnicodeDecodeError, ValueError):
+		et = ET.fromstring(doc)
+		return accessionNum(et), displayDate(et), tickercreator(et)
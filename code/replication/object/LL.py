@@ -2,6 +2,8 @@
 Specialized linked list for use in the simularity project.
 """
 
+from collections import Counter
+
 class myLinkedList:
 	'''
 	A linked list. One key property of this LL is that the next node can be 
@@ -37,4 +39,51 @@ class LLNode():
 	nextNode = None;
 	def __init__(self, val=None, nextNode=None):
 		self.val = val
-		self.nextNode = nextNode
\ No newline at end of file
+		self.nextNode = nextNode
+class IndexedList(myLinkedList):
+	'''
+	A myLinkedList that also keeps, for every term of the values it holds, 
+	the set of these values (postings). Values are indexed when they are 
+	added to the front, and removed from the postings when they are cut.
+	'''
+	def __init__(self, terms):
+		'''terms is the function that gives the terms of a value.'''
+		super().__init__()
+		self.terms = terms
+		self.postings = dict()
+
+	def addFront(self, val):
+		super().addFront(val)
+		for term in self.terms(val):
+			if term in self.postings:
+				self.postings[term].add(val)
+			else:
+				self.postings[term] = {val}
+
+	def cut(self):
+		node = self.curr.nextNode
+		super().cut()
+		while (node != None):
+			for term in self.terms(node.val):
+				values = self.postings[term]
+				values.discard(node.val)
+				if not values:
+					del self.postings[term]
+			node = node.nextNode
+
+	def overlaps(self, terms):
+		'''
+		Returns a Counter of the number of terms (distinct) each value of 
+		the list has, in one pass over the postings of terms.
+		'''
+		counts = Counter()
+		for term in terms:
+			values = self.postings.get(term)
+			if values:
+				counts.update(values)
+		return counts
+
+	def unionOverlap(self, terms, values):
+		'''Returns the number of terms (distinct) found in any of values.'''
+		values = set(values)
+		return sum(1 for term in terms if not values.isdisjoint(self.postings.get(term, ())))
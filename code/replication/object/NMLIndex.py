@@ -0,0 +1,175 @@
+"""
+Persistent byte-offset index for nml files.
+
+Each nml file gets a sidecar csv file (filename + '.idx') holding, for every
+article, its byte offset, length, md5, display date (seconds since the epoch)
+and tickers. The first row records the size and mtime of the nml file, so a
+stale index is detected and rebuilt. With the index the procedure can seek to
+any time point and skip articles without tickers before any XML is parsed.
+Given an index_dir, the indexes are kept there instead (as its basename +
+'.idx'), and the directory of the nml files is left untouched.
+"""
+
+import bisect
+import csv
+import math
+import mmap
+import os
+import sys
+from collections import namedtuple
+from functools import partial
+from multiprocessing import Pool, cpu_count
+
+from FieldExtractor import extractHeader
+from NMLReader import docSlices
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "measures"))
+from timestamps import parse_epochs
+
+INDEX_VERSION = "nmlindex-1"
+
+IndexEntry = namedtuple("IndexEntry", ["offset", "length", "md5", "date", "tickers"])
+
+
+def indexPath(filename, index_dir=None):
+	'''Returns the location of the index of filename, within index_dir if given.'''
+	if index_dir is not None:
+		return os.path.join(index_dir, os.path.basename(filename) + ".idx")
+	return filename + ".idx"
+
+
+def fileStamp(filename):
+	'''Returns the (size, mtime) pair used to check an index for staleness.'''
+	st = os.stat(filename)
+	return st.st_size, st.st_mtime_ns
+
+
+def describe(doc):
+	'''
+	Given the bytes of one article, returns its md5, display date (as written)
+	and tickers. Articles that do not parse get an empty md5, a date of None
+	and no tickers.
+	'''
+	try:
+		return extractHeader(doc)
+	except Exception:
+		return "", None, []
+
+
+def buildIndex(filename, index_dir=None):
+	'''
+	Scans filename once and writes its index. Returns the number of articles.
+	'''
+	if index_dir is not None:
+		os.makedirs(index_dir, exist_ok=True)
+	size, mtime = fileStamp(filename)
+	rows, offset = [], 0
+	for doc in docSlices(filename):
+		rows.append((offset, doc.nbytes) + tuple(describe(doc)))
+		offset += doc.nbytes
+	# The dates are converted together, those that do not parse become nan.
+	dates = parse_epochs([date or "" for _, _, _, date, _ in rows], invalid=math.nan)
+	temp = indexPath(filename, index_dir) + ".tmp"
+	with open(temp, 'w', newline='') as idxFile:
+		writer = csv.writer(idxFile, delimiter=',')
+		writer.writerow([INDEX_VERSION, size, mtime])
+		for (offset, length, md5, _, tickers), date in zip(rows, dates.tolist()):
+			if math.isnan(date):
+				md5, tickers = "", []
+			writer.writerow([offset, length, md5, "" if math.isnan(date) else repr(date), " ".join(tickers)])
+	os.replace(temp, indexPath(filename, index_dir))
+	return len(rows)
+
+
+def isStale(filename, index_dir=None):
+	'''Returns True if the index of filename is missing or out of date.'''
+	try:
+		with open(indexPath(filename, index_dir), newline='') as idxFile:
+			header = next(csv.reader(idxFile, delimiter=','))
+	except (OSError, StopIteration):
+		return True
+	return header != [INDEX_VERSION] + [str(v) for v in fileStamp(filename)]
+
+
+def readIndex(filename, index_dir=None):
+	'''Reads the index of filename without checking it, returns a list of IndexEntry.'''
+	entries = []
+	with open(indexPath(filename, index_dir), newline='') as idxFile:
+		reader = csv.reader(idxFile, delimiter=',')
+		next(reader)
+		for offset, length, md5, date, tickers in reader:
+			entries.append(IndexEntry(int(offset), int(length), md5,
+				float(date) if date else None, tickers.split()))
+	return entries
+
+
+def loadIndex(filename, index_dir=None):
+	'''Returns the index of filename, (re)building it first if it is stale.'''
+	if isStale(filename, index_dir):
+		buildIndex(filename, index_dir)
+	return readIndex(filename, index_dir)
+
+
+def ensureIndexes(filenames, worker_count=-1, index_dir=None):
+	'''
+	Builds the missing or stale indexes of filenames in parallel, one file per
+	task. Returns the files that were (re)indexed.
+	'''
+	stale = [f for f in filenames if isStale(f, index_dir)]
+	if worker_count < 0:
+		worker_count += cpu_count() + 1
+	if len(stale) > 1 and worker_count > 1:
+		with Pool(min(worker_count, len(stale))) as pool:
+			pool.map(partial(buildIndex, index_dir=index_dir), stale)
+	else:
+		[buildIndex(f, index_dir) for f in stale]
+	return stale
+
+
+def withTickers(entries):
+	'''Returns the entries of articles that have at least one ticker.'''
+	return [e for e in entries if e.tickers]
+
+
+def since(entries, epoch):
+	'''
+	Returns the entries from the first article displayed at or after epoch.
+	Assumes the entries are in chronological order, as the nml files are.
+	'''
+	dates = [e.date if e.date is not None else float("-inf") for e in entries]
+	return entries[bisect.bisect_left(dates, epoch):]
+
+
+def tail(entries, seconds):
+	'''
+	Returns the entries of the articles displayed within seconds of the last
+	article, which are the articles needed to warm up the next file.
+	'''
+	dated = [e for e in entries if e.date is not None]
+	if not dated:
+		return []
+	return since(dated, dated[-1].date - seconds)
+
+
+def indexedGetter(filename, entries):
+	'''
+	A getter function for the given articles of filename. Seeks straight to each
+	entry and returns a memoryview of its bytes, released once the next article
+	is requested (see docSlices).
+	'''
+	if not entries:
+		return
+	with open(filename, 'rb') as nmlFile:
+		mm = mmap.mmap(nmlFile.fileno(), 0, access=mmap.ACCESS_READ)
+	view = memoryview(mm)
+	try:
+		for e in entries:
+			doc = view[e.offset:e.offset + e.length]
+			yield doc
+			doc.release()
+	finally:
+		view.release()
+		try:
+			mm.close()
+		except BufferError:
+			pass
@@ -0,0 +1,250 @@
+"""
+Readers that split nml files into documents without rebuilding strings.
+
+Plain nml files are memory mapped. Files compressed with gzip, bzip2 or xz
+(file.nml.gz, file.nml.bz2, file.nml.xz) and tar archives of nml files are
+streamed instead: a background thread decompresses the next chunks while the
+documents of the current ones are being parsed. zlib, bz2 and lzma release
+the GIL while they decompress, so the thread runs in parallel to the caller.
+"""
+
+import bz2
+import glob
+import gzip
+import lzma
+import mmap
+import os
+import queue
+import tarfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DOC_END = b"</doc>"
+CHUNK_SIZE = 1 << 20
+READ_AHEAD = 8
+COMPRESSED = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+ARCHIVES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+
+def docSlices(filename):
+	'''
+	A getter function for each article. The file is memory mapped and split by
+	the </doc> tag, and each article is returned as a memoryview over the mapped
+	bytes, ending with the line that holds the tag (as in textGetter). No bytes
+	are copied or decoded here. A slice is released once the next article is
+	requested, so it must be used (sent, parsed or copied with bytes()) before then.
+	'''
+	with open(filename, 'rb') as nmlFile:
+		try:
+			mm = mmap.mmap(nmlFile.fileno(), 0, access=mmap.ACCESS_READ)
+		except ValueError: # Empty files can not be mapped.
+			return
+	view = memoryview(mm)
+	try:
+		start, size = 0, len(mm)
+		while True:
+			tag = mm.find(DOC_END, start)
+			if tag < 0:
+				break
+			end = mm.find(b"\n", tag + len(DOC_END))
+			end = size if end < 0 else end + 1
+			doc = view[start:end]
+			yield doc
+			doc.release()
+			start = end
+	finally:
+		view.release()
+		try:
+			mm.close()
+		except BufferError: # A caller kept a slice, the map is freed with it.
+			pass
+
+
+def docOffsets(filename):
+	'''
+	A getter for the (offset, length) of each article of filename, split as in
+	docSlices, without handing out any of the bytes.
+	'''
+	offset = 0
+	for doc in docSlices(filename):
+		yield offset, doc.nbytes
+		offset += doc.nbytes
+
+
+def mmapTextGetter(filename):
+	'''
+	A getter function for each article. Same interface as textGetter, but
+	returns the article as undecoded bytes. Article accepts these directly.
+	'''
+	for doc in docSlices(filename):
+		yield doc.tobytes()
+
+
+def isArchive(filename):
+	'''Returns True if filename is a tar archive (compressed or not).'''
+	return filename.lower().endswith(ARCHIVES)
+
+
+def isCompressed(filename):
+	'''Returns True if filename is a compressed nml file.'''
+	name, ext = os.path.splitext(filename.lower())
+	return ext in COMPRESSED and name.endswith(".nml")
+
+
+def nmlFiles(startlocation):
+	'''
+	Returns, sorted, the nml files of startlocation: plain, compressed or tar
+	archives. Only plain files can be memory mapped and indexed.
+	'''
+	found = glob.glob(os.path.join(startlocation, '*'))
+	return sorted(f for f in found if os.path.isfile(f) and
+		(f.endswith(".nml") or isCompressed(f) or isArchive(f)))
+
+
+def _memberStreams(filename):
+	'''
+	Yields a readable binary stream for each nml file held in filename: the
+	decompressed file itself, or each nml member of a tar archive, in the order
+	of the archive. Members that are compressed nml files are decompressed too.
+	'''
+	if not isArchive(filename):
+		ext = os.path.splitext(filename)[1].lower()
+		with COMPRESSED.get(ext, open)(filename, 'rb') as stream:
+			yield stream
+		return
+	with tarfile.open(filename, 'r:*') as archive:
+		for member in archive:
+			name = member.name.lower()
+			if not member.isfile() or not (name.endswith(".nml") or isCompressed(name)):
+				continue
+			stream = archive.extractfile(member)
+			ext = os.path.splitext(name)[1]
+			if ext in COMPRESSED:
+				stream = COMPRESSED[ext](stream, 'rb')
+			with stream:
+				yield stream
+
+
+def _produce(filename, chunks, chunk_size, stop):
+	'''
+	Reads filename in the background. Puts the decompressed chunks of every
+	member on chunks, None at the end of each member, then the end marker
+	(or the exception that stopped it).
+	'''
+	try:
+		for stream in _memberStreams(filename):
+			while not stop.is_set():
+				chunk = stream.read(chunk_size)
+				if not chunk:
+					break
+				chunks.put(chunk)
+			chunks.put(None)
+			if stop.is_set():
+				return
+		chunks.put(StopIteration)
+	except BaseException as e:
+		chunks.put(e)
+
+
+def _chunks(filename, chunk_size, read_ahead):
+	'''
+	Yields the decompressed chunks of filename, None between members. With
+	read_ahead > 0, up to read_ahead chunks are decompressed ahead by a thread.
+	'''
+	if read_ahead <= 0:
+		for stream in _memberStreams(filename):
+			yield from iter(lambda: stream.read(chunk_size), b"")
+			yield None
+		return
+	chunks, stop = queue.Queue(read_ahead), threading.Event()
+	thread = threading.Thread(target=_produce, args=(filename, chunks, chunk_size, stop), daemon=True)
+	thread.start()
+	try:
+		while True:
+			chunk = chunks.get()
+			if chunk is StopIteration:
+				return
+			if isinstance(chunk, BaseException):
+				raise chunk
+			yield chunk
+	finally:
+		stop.set()
+		while thread.is_alive(): # Unblocks a producer waiting on a full queue
+			try:
+				chunks.get(timeout=0.1)
+			except queue.Empty:
+				pass
+		thread.join()
+
+
+def streamGetter(filename, chunk_size=CHUNK_SIZE, read_ahead=READ_AHEAD):
+	'''
+	A getter function for each article of a compressed nml file or tar archive.
+	Articles are split as in docSlices, each member of an archive on its own,
+	and are returned as bytes.
+	'''
+	buffer, start, scan = bytearray(), 0, 0
+	for chunk in _chunks(filename, chunk_size, read_ahead):
+		if chunk is None: # End of a member, as in docSlices a last tag ends the file
+			if buffer.find(DOC_END, scan) >= 0:
+				yield bytes(buffer[start:])
+			buffer, start, scan = bytearray(), 0, 0
+			continue
+		buffer += chunk
+		while True:
+			tag = buffer.find(DOC_END, scan)
+			if tag < 0:
+				scan = max(start, len(buffer) - len(DOC_END) + 1)
+				break
+			end = buffer.find(b"\n", tag + len(DOC_END))
+			if end < 0: # The rest of the line is in the next chunk
+				scan = tag
+				break
+			yield bytes(buffer[start:end + 1])
+			start = scan = end + 1
+		if start > len(buffer) // 2:
+			del buffer[:start]
+			scan -= start
+			start = 0
+
+
+def _prepare(filename, getter):
+	'''
+	Opens filename with getter and fetches its first article. Plain files are
+	also handed to the kernel read ahead, so their pages are being loaded.
+	'''
+	if filename.endswith(".nml") and hasattr(os, "posix_fadvise"):
+		with open(filename, 'rb') as nmlFile:
+			os.posix_fadvise(nmlFile.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+	docs = iter(getter(filename))
+	return next(docs, None), docs
+
+
+def chainGetter(filenames, getter=None):
+	'''
+	A getter for the articles of all filenames as one continuous sequence, in
+	order. getter(filename) gives the articles of one file (docGetter by
+	default). While a file is being read, a background thread opens the next
+	one and fetches its first article, so there is no wait at file boundaries.
+	'''
+	getter = getter or docGetter
+	with ThreadPoolExecutor(1) as ahead:
+		upcoming = ahead.submit(_prepare, filenames[0], getter) if filenames else None
+		for i in range(len(filenames)):
+			first, docs = upcoming.result()
+			if i + 1 < len(filenames):
+				upcoming = ahead.submit(_prepare, filenames[i + 1], getter)
+			if first is None:
+				continue
+			yield first
+			yield from docs
+
+
+def docGetter(filename):
+	'''
+	A getter function for each article of any nml file: memory mapped slices
+	for plain files (see docSlices), bytes for compressed files and archives.
+	'''
+	if filename.endswith(".nml"):
+		return docSlices(filename)
+	return streamGetter(filename)
@@ -0,0 +1,112 @@
+"""
+Corpus-wide near-duplicate index, across tickers.
+
+The procedure compares an article only with the articles of its own tickers.
+The index sees every article once, in order, whatever its tickers, and links
+it to its closest prior article displayed within the look back: the one that
+has the largest share of its terms, among the articles sharing a MinHash LSH
+bucket with it (see lsh_similarity.LSHSignatures). Only these candidates are
+scored, so there is no all-pairs pass. An article whose closest prior article
+has at least threshold of its terms joins the cluster of that article, the
+others start a cluster of their own, named after their accession number: a
+reprint cascade is one cluster, across all the tickers it was tagged with.
+The term ids and the signature of an article (its sketch) do not depend on
+the other articles, so the suppliers compute them (see sketch), and the
+index only looks up the buckets and scores the candidates, in order.
+"""
+
+import os
+import sys
+from collections import deque, Counter
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "measures"))
+from lsh_similarity import LSHSignatures
+from term_ids import TermIds, overlaps
+
+# Columns added to the output with clusters (see Similarity.header).
+CLUSTER_COLUMNS = ['CLUSTER_ID', 'GLOBAL_CLOSEST_ID', 'GLOBAL_CLOSEST_SCORE']
+
+class NearDuplicateIndex:
+
+	def __init__(self, look_back = 259200, threshold = 0.8, bands = 32, rows = 4, seed = 0):
+		self.look_back = look_back
+		self.threshold = threshold
+		self.signatures = LSHSignatures(bands, rows, seed)
+		self.termIds = TermIds()
+		self.buckets = dict() # bucket key -> deque of the sequence numbers of its articles
+		self.live = dict() # sequence number -> (accession number, ids, keys, cluster)
+		self.order = deque() # (display date, sequence number), in the order of the articles
+		self.count = 0
+		self.counts = Counter()
+
+	def ids(self, terms):
+		"""
+		Returns the sorted, distinct term ids of terms, an array of ids already
+		(see HashedBoWSimularity) or the terms themselves.
+		"""
+		if isinstance(terms, np.ndarray):
+			return np.unique(terms)
+		return self.termIds.array(terms)
+
+	def expire(self, displayDate):
+		"""
+		Removes the articles displayed more than look_back before displayDate.
+		They were added in order, so they are the first ones of their buckets.
+		"""
+		while self.order and displayDate - self.order[0][0] > self.look_back:
+			_, seq = self.order.popleft()
+			_, _, keys, _ = self.live.pop(seq)
+			for key in keys:
+				bucket = self.buckets[key]
+				bucket.popleft()
+				if not bucket:
+					del self.buckets[key]
+
+	def sketch(self, terms):
+		"""
+		Returns the sketch of an article given its terms: its term ids, and its
+		signature (None without terms).
+		"""
+		ids = self.ids(terms)
+		return ids, self.signatures.signature(ids) if len(ids) else None
+
+	def assign(self, story, sketch):
+		"""
+		Adds story, given its sketch, and returns its CLUSTER_COLUMNS: its
+		cluster, and the accession number and score of its closest prior article
+		(None without candidates). Stories must be given in display order.
+		"""
+		self.expire(story.displayDate)
+		ids, signature = sketch
+		keys = self.signatures.keys(signature) if signature is not None else []
+		found = set()
+		for key in keys:
+			found.update(self.buckets.get(key, ()))
+		cluster, closest, score = story.accessionNumber, None, None
+		if found:
+			candidates = sorted(found) # Oldest first, which wins ties
+			scores = overlaps(ids, [self.live[seq][1] for seq in candidates]) / len(ids)
+			best = int(np.argmax(scores))
+			closest, _, _, closestCluster = self.live[candidates[best]]
+			score = float(scores[best])
+			if score >= self.threshold:
+				cluster = closestCluster
+				self.counts["linked"] += 1
+			self.counts["scored"] += len(candidates)
+		self.counts["stories"] += 1
+		self.counts["pairs"] += len(self.live)
+		seq, self.count = self.count, self.count + 1
+		self.live[seq] = (story.accessionNumber, ids, keys, cluster)
+		self.order.append((story.displayDate, seq))
+		for key in keys:
+			self.buckets.setdefault(key, deque()).append(seq)
+		return [cluster, closest, score]
+
+	def report(self):
+		"""
+		Returns a one line summary of the stories linked and the candidates scored.
+		"""
+		c = self.counts
+		return (f"Near duplicates... {c['linked']} of {c['stories']} stories joined the cluster of a prior story, "
+			f"{c['scored']} of {c['pairs']} prior stories scored ({100 * c['scored'] / max(c['pairs'], 1):.2f}%)")
@@ -5,63 +5,169 @@ import time
 import glob
 import sys
 import os
-from multiprocessing import cpu_count
+from multiprocessing import cpu_count, Pool, Queue
 import csv
 from ETUtils import *
+from NMLReader import chainGetter, docGetter, docOffsets, nmlFiles
+from NMLIndex import ensureIndexes, loadIndex, indexedGetter
+from SlicePlanner import corpusEntries, planSlices
+from TokenStore import TokenStore, isStore
+from DocFilter import DocFilter
+from StemTable import loadStemTable
+from NearDuplicates import NearDuplicateIndex
 
-def procedure(startlocation = 'data', endlocation='export_dataframe.csv', simtest=CosineSimilarity(), worker_count=-1):
+def batchGetter(f, entries, batch_size):
+	'''
+	A getter for batches of up to batch_size articles of f, for the offset 
+	suppliers. Plain files give (f, offset, length) descriptors, of the index 
+	entries if given, and the others their raw articles.
+	'''
+	if entries is not None:
+		items = ((f, e.offset, e.length) for e in entries)
+	elif f.endswith('.nml'):
+		items = ((f, offset, length) for offset, length in docOffsets(f))
+	else:
+		items = docGetter(f)
+	batch = []
+	for item in items:
+		batch.append(item)
+		if len(batch) == batch_size:
+			yield batch
+			batch = []
+	if batch:
+		yield batch
+
+def procedure(startlocation = 'data', endlocation='export_dataframe.csv', simtest=None, worker_count=-1, use_index=False, offsets=False, batch_size=64, tickers=None, start=None, end=None, stem_table=None, keep_text=False, clusters=False, index_dir=None):
 	'''
 	Performs the procedure for the specified amount of articles. Uses 
 	all nml files from startlocation, and exports a csv file at endlocation.
 
 	To paralyze this process, some workers are used to process the articles, 
-	and some are used to compare the similarity.  The XML text is sent to all 
+	and some are used to compare the similarity.  The raw XML bytes of each 
+	article are sliced from a memory map of the file and sent to all 
 	the different suppliers workers then are retrieved in order, this preserves 
 	the chronological order.  These are all then sent to the appropriate workers 
 	witch process the article in the order that they were received.  This results 
 	in the algorithm beinng able to utalize multiple threades while still 
-	processing the articles in the appropriate order.
+	processing the articles in the appropriate order. The articles of all the 
+	files flow as one sequence, the next file is opened ahead by a thread, and 
+	the suppliers are only drained once, at the end.
+
+	With use_index, each file's byte-offset index (see NMLIndex) is built or 
+	refreshed first, and only the articles that pass the filter (all of them 
+	in range with clusters) are read and sent. The indexes are written next to the files, or 
+	in index_dir if given.
+	Compressed nml files (.nml.gz, .nml.bz2, .nml.xz) and tar archives are 
+	decompressed while they are read, by a background thread (see NMLReader), 
+	and are never indexed. A token store (see TokenStore) can be given as 
+	startlocation instead, see storedProcedure.
+
+	With offsets, the parent only reads the index (or splits the memory map) 
+	and sends batches of batch_size (file, offset, length) descriptors, the 
+	suppliers map the files and read the articles themselves, and send back 
+	their stories batch by batch (see offsetSupplier). No article bytes cross 
+	the pipes, apart from those of compressed files.
+
+	Only the articles about tickers (an allow-list, all tickers if None) 
+	displayed from start to end (epochs or date strings, in UTC) are processed 
+	(see DocFilter). Others are rejected from the index, or from the head of 
+	the article in the suppliers, before any body text is read, and the number 
+	skipped at each stage is printed at the end.
+
+	A stem table (see StemTable) given as stem_table is loaded before the 
+	suppliers start, so they do not stem the words it has.
+
+	The processors only get the features of the articles they compare (see 
+	StoryRecord), their headline and text are only kept with keep_text.
+
+	simtest is a new CosineSimilarity if None. It can also be a list of 
+	Similarity objects, which are all run in the same pass (see 
+	MultiSimilarity): every article is parsed and tokenized once, and the csv 
+	file has a group of columns per measure.
+
+	With clusters, the parent also links every article to its closest prior 
+	article of any ticker within the look back, in a near-duplicate index (see 
+	NearDuplicates), and the rows end with its cluster and that article. Every 
+	article displayed from the warm-up to end is read, tokenized and added to 
+	the index, with or without tickers: the allow-list only selects the 
+	tickers sent to the processors. The suppliers compute the sketch of each 
+	article, the parent only adds it to the index. A cluster is named after 
+	its first article, so with start, after its first one in the warm-up.
 	'''
+	if simtest is None:
+		simtest = CosineSimilarity()
+	if isinstance(simtest, (list, tuple)):
+		simtest = MultiSimilarity(simtest)
+	if isStore(startlocation):
+		return storedProcedure(startlocation, endlocation, simtest, worker_count, tickers, start, end, clusters)
 
 	if worker_count < 0:
 		worker_count += cpu_count() + 1
 
+	location = nmlFiles(startlocation)
+	indexed = [f for f in location if use_index and f.endswith('.nml')]
+	ensureIndexes(indexed, worker_count, index_dir)
+	docFilter = DocFilter(tickers, start, end, simtest.look_back, clusters=clusters)
+	if stem_table is not None:
+		simtest.useStemTable(loadStemTable(stem_table))
+	simtest.clusters = clusters
+	index = NearDuplicateIndex(simtest.look_back) if clusters else None
+
 	# Empirically found that using more threades than were available and allowing 
 	# the scheduler to decide which would run decreased run time, belied to be caused 
 	# by idle workers. 
 	worker_count = int(worker_count * 3)
 	
-	location = sorted(glob.glob(os.path.join(startlocation,'*.nml')))
 	companies = dict()
-	suppliers, supplier_processes = worker_init(worker_count, "supplier", simtest)
-	processors, processor_processes = worker_init(worker_count, "processor", simtest)
-	for f in location:
+	suppliers, supplier_processes = worker_init(worker_count, "offsetSupplier" if offsets else "supplier", simtest, docFilter, keep_text, index=index)
+	processorReports = Queue()
+	processors, processor_processes = worker_init(worker_count, "processor", simtest, reports=processorReports)
+	send = "send" if offsets else "send_bytes"
+
+	def opener(f):
 		print("File processing...",f)
-		xtg = textGetter(f)
-		
-		for supplier in suppliers: # Send out the first batch of articles
+		if offsets:
+			return batchGetter(f, docFilter.entries(loadIndex(f, index_dir)) if f in indexed else None, batch_size)
+		return indexedGetter(f, docFilter.entries(loadIndex(f, index_dir))) if f in indexed else docGetter(f)
+	xtg = chainGetter(location, opener)
+
+	sent = 0
+	for supplier in suppliers: # Send out the first batch of articles
+		try:
+			et = next(xtg)
+		except StopIteration:
+			break
+		getattr(supplier, send)(et)
+		sent += 1
+
+	checks, load = len(suppliers) - sent, 0 # Suppliers that got nothing are already done
+	processed, warmup, indexOnly = 0, 0, 0
+	while checks < len(suppliers): # Makes sure to get back all articles before finishing
+		for supplier in suppliers:
+			if checks >= len(suppliers):
+				break
+
+			received = supplier.recv() # Gets back an article in apropriate oreder by waiting
+
 			try:
 				et = next(xtg)
+				getattr(supplier, send)(et)
 			except StopIteration:
-				break
-			supplier.send(et)
-
-		checks, load = 0, 0
-		while checks < len(suppliers): # Makes sure to get back all articles before moving on
-			for supplier in suppliers:
-				if checks >= len(suppliers):
-					break
-
-				story = supplier.recv() # Gets back an article in apropriate oreder by waiting
-
-				try:
-					et = next(xtg)
-					supplier.send(et)
-				except StopIteration:
-					checks += 1 
-				
-				if not story.bad and not (story.tickers == []):
-					for ticker in story.tickers:
+				checks += 1 
+			
+			for story in (received if offsets else [received]):
+				if story.skipped:
+					docFilter.count("header", story.skipped)
+				if not story.bad and story.skipped is None:
+					if index is not None:
+						story.cluster, story.sketch = index.assign(story, story.sketch), None
+					tickers = docFilter.narrow(story.tickers, "header")
+					if not tickers: # Read for the index only
+						indexOnly += 1
+						continue
+					processed += 1
+					warmup += story.warmup
+					for ticker in tickers:
 						if '.' in ticker:
 							continue
 						if ticker not in companies:
@@ -69,13 +175,101 @@ def procedure(startlocation = 'data', endlocation='export_dataframe.csv', simtes
 							load = (load + 1) % worker_count
 						processors[companies[ticker]].put((story, ticker))
 
-	[a.send("ad mortem") for a in suppliers]
+	[a.send(None) if offsets else a.send_bytes(b"ad mortem") for a in suppliers]
+	reports = [a.recv() for a in suppliers]
 	[w.join() for w in supplier_processes]
 
 	[q.put((None, "ad mortem")) for q in processors]
+	reports += [processorReports.get() for q in processors]
+	[w.join() for w in processor_processes]
+
+	merge(endlocation, [f"temp_file_{i}.csv" for i in range(worker_count)])
+	print(docFilter.report())
+	[print(report) for report in reports if report]
+	if index is not None:
+		print(index.report())
+		print("Articles only clustered (no tickers, or none allowed)...", indexOnly)
+	print("Articles processed...", processed, "of which warm-up", warmup)
+	print('Procedure finished')
+
+def storedProcedure(startlocation = 'token_store', endlocation='export_dataframe.csv', simtest=None, worker_count=-1, tickers=None, start=None, end=None, clusters=False):
+	'''
+	Performs the procedure on the articles of the token store at startlocation. 
+	No XML is parsed and nothing is tokenized, the stored terms are handed to 
+	simtest.fromTerms, so there are no suppliers, only processors. The articles 
+	are filtered, and clustered with clusters, as in procedure; the store only 
+	holds the articles with tickers, so only these are clustered.
+	'''
+	if simtest is None:
+		simtest = CosineSimilarity()
+	if worker_count < 0:
+		worker_count += cpu_count() + 1
+
+	store = TokenStore(startlocation)
+	print("Store loaded...", len(store), "articles")
+	docFilter = DocFilter(tickers, start, end, simtest.look_back, clusters=clusters)
+	simtest.clusters = clusters
+	index = NearDuplicateIndex(simtest.look_back) if clusters else None
+	companies = dict()
+	load = 0
+	processorReports = Queue()
+	processors, processor_processes = worker_init(worker_count, "processor", simtest, reports=processorReports)
+	for story in store.stories(simtest, docFilter=docFilter):
+		if index is not None:
+			story.cluster = index.assign(story, index.sketch(simtest.terms(story)))
+		for ticker in docFilter.narrow(story.tickers, "store"):
+			if '.' in ticker:
+				continue
+			if ticker not in companies:
+				companies[ticker] = load #Assings a ticker to specific worker
+				load = (load + 1) % worker_count
+			processors[companies[ticker]].put((story, ticker))
+
+	[q.put((None, "ad mortem")) for q in processors]
+	reports = [processorReports.get() for q in processors]
 	[w.join() for w in processor_processes]
 
 	merge(endlocation, [f"temp_file_{i}.csv" for i in range(worker_count)])
+	print(docFilter.report())
+	[print(report) for report in reports if report]
+	if index is not None:
+		print(index.report())
+	print('Procedure finished')
+
+def slicedProcedure(startlocation = 'data', endlocation='export_dataframe.csv', simtest=None, worker_count=-1, slice_count=None, index_dir=None):
+	'''
+	Performs the procedure on balanced time slices of the corpus, run in 
+	parallel. The articles with tickers of all nml files from startlocation are 
+	cut into slice_count slices (default worker_count) of about the same number 
+	of articles (see SlicePlanner), each one warmed up with the articles of the 
+	preceding simtest.look_back seconds. Every slice is processed by a single 
+	worker, and the results are joined in order, so the csv file at endlocation 
+	lists the rows in the order of the articles, the same as with one slice.
+	Slicing needs the indexes, so only plain nml files are used; they are 
+	written next to the files, or in index_dir if given. simtest can be a list 
+	of Similarity objects, as in procedure. Slices have no clusters: each one 
+	only sees its part of the corpus.
+	'''
+	if simtest is None:
+		simtest = CosineSimilarity()
+	if isinstance(simtest, (list, tuple)):
+		simtest = MultiSimilarity(simtest)
+	simtest.clusters = False
+	if worker_count < 0:
+		worker_count += cpu_count() + 1
+
+	location = sorted(glob.glob(os.path.join(startlocation,'*.nml')))
+	ensureIndexes(location, worker_count, index_dir)
+	entries = corpusEntries(location, index_dir)
+	slices = planSlices(entries, slice_count or worker_count, simtest.look_back)
+	temp_files = [f"temp_slice_{i}.csv" for i in range(len(slices))]
+	tasks = [(entries[s.warmup:s.end], s.start - s.warmup, simtest, temp) for s, temp in zip(slices, temp_files)]
+	print("Slices planned...", [s.end - s.start for s in slices])
+	with Pool(worker_count) as pool:
+		reports = pool.map(sliceWorker, tasks, chunksize=1)
+
+	concatenate(endlocation, temp_files)
+	[print(report) for report in reports if report]
 	print('Procedure finished')
 
 if __name__ == '__main__':
@@ -2,41 +2,88 @@
 Class that can compare two different Articles. 
 """
 
+import os
+import sys
 from collections import Counter
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from nltk.corpus import stopwords 
-from nltk.tokenize import word_tokenize
 import nltk
 import heapq
+from hashlib import blake2b
 from nltk.stem.porter import *
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "measures"))
+from tokenizer import word_tokenize
+from term_ids import TermIds, TERM_BITS, bitmap, overlap, overlaps, union
+from LL import myLinkedList, IndexedList
+from NearDuplicates import CLUSTER_COLUMNS
+
+# Columns of the output: those of the article, then those of the measure.
+STORY_COLUMNS = ['DATE_EST', 'STORY_ID', 'TICKER']
+MEASURE_COLUMNS = ['STORY_LENGTH', 'CLOSEST_ID', 'SECOND_CLOSEST_ID', 'CLOSEST_SCORE', 'TOTAL_OVERLAP', 'IS_OLD', 'IS_REPRINT', 'IS_RECOMB']
+# Number of distinct texts whose preprocessing a worker keeps for reprints.
+CONTENT_CACHE = 1024
+
+def contentDigest(text):
+	'''
+	Returns the key of the body text of an article, a 16 byte hash. The text 
+	is already normalized by the extraction (markup, entities and line ends, 
+	see FieldExtractor), whitespace is not folded any further since the 
+	tokenizer does not treat all of it the same.
+	'''
+	return blake2b(text.encode("utf-8"), digest_size=16).digest()
 
 class Similarity:
 
+	hasTerms = True # The pre of a story is made of its terms, see terms
+
 	def __init__(self, num_closest = 5, old_news = 0.6, reprint = 0.8, look_back_days = 3):
 		self.old_news = old_news
 		self.reprint = reprint
 		self.num_closest = num_closest
 		self.look_back = 86400 * look_back_days
+		self.tableSize = None
+		self.contents = dict()
+		self.fastPath = Counter()
+		self.clusters = False
 
 	def staleNewsProcedure(self, ticker, story, companyLL):
 		'''
 		Performs the stalen news procedure for one article. Returns the similarity 
 		information for this article compared to the articles up to 72 hours prior.
 		'''
-		companyLL.resetCurr()
-		compStory = companyLL.nextNode()
-		maxpq = []
-		while (compStory != None):
-			if story.displayDate - compStory.displayDate > self.look_back:
-				companyLL.cut();
-				break;
-			sim = self.similaritytest(story, [compStory])
-			heapq.heappush(maxpq, (sim, compStory))
-			compStory = companyLL.nextNode()
-		largestN = heapq.nlargest(self.num_closest, maxpq)
-		old_reprint_recomb = self.stale(story, largestN)
+		neighbors = self.window(story, companyLL)
 		companyLL.addFront(story)
+		row = [story.displayDate, story.accessionNumber, ticker] + self.compare(story, neighbors)
+		return row + story.cluster if self.clusters else row
+
+	def header(self):
+		'''
+		Returns the names of the columns of the rows of staleNewsProcedure, with 
+		CLUSTER_COLUMNS last if clusters (see NearDuplicates).
+		'''
+		return STORY_COLUMNS + self.measureColumns() + (CLUSTER_COLUMNS if self.clusters else [])
+
+	def measureColumns(self):
+		'''Returns the names of the columns of compare.'''
+		return MEASURE_COLUMNS
+
+	def terms(self, story):
+		'''
+		Returns the terms of a preprocessed story, for the near-duplicate index 
+		(see NearDuplicates): its pre, a set or Counter of stems or an array of 
+		term ids for most measures, its fingerprints for those without hasTerms.
+		'''
+		return story.pre
+
+	def compare(self, story, neighbors):
+		'''
+		Returns the measure columns of story (see MEASURE_COLUMNS) given the 
+		stories of its window, most recent first.
+		'''
+		largestN = self.closest(story, neighbors)
+		old_reprint_recomb = self.stale(story, largestN)
 		if (largestN != []):
 			largestacc = largestN[0][1].accessionNumber
 			largestsim = largestN[0][0]
@@ -47,7 +94,83 @@ class Similarity:
 			secondlargestacc = largestN[1][1].accessionNumber
 		else:
 			secondlargestacc = None
-		return [story.displayDate, story.accessionNumber, ticker, len(story.pre), largestacc, secondlargestacc, largestsim, old_reprint_recomb[3], old_reprint_recomb[0], old_reprint_recomb[1], old_reprint_recomb[2]]
+		return [len(story.pre), largestacc, secondlargestacc, largestsim, old_reprint_recomb[3], old_reprint_recomb[0], old_reprint_recomb[1], old_reprint_recomb[2]]
+
+	def newWindow(self):
+		'''
+		Returns the linked list that keeps the stories of a new ticker, most 
+		recent first. Subclasses can index them as they are added and cut.
+		'''
+		return myLinkedList()
+
+	def window(self, story, companyLL):
+		'''
+		Returns the stories of companyLL displayed up to look_back before story, 
+		most recent first, and cuts the older ones from the list.
+		'''
+		companyLL.resetCurr()
+		compStory = companyLL.nextNode()
+		neighbors = []
+		while (compStory != None):
+			if story.displayDate - compStory.displayDate > self.look_back:
+				companyLL.cut();
+				break;
+			neighbors.append(compStory)
+			compStory = companyLL.nextNode()
+		return neighbors
+
+	def closest(self, story, neighbors):
+		'''
+		Returns the (score, story) of the num_closest highest scored neighbors, 
+		highest first, as heapq.nlargest gives them from the heap of the whole 
+		window.
+		'''
+		firsts, index = self.distinct(story, neighbors)
+		return self.largest(self.similarityBatch(story, firsts), index, neighbors)
+
+	def largest(self, scores, index, neighbors):
+		'''
+		Returns the (score, story) of the num_closest highest scored neighbors 
+		from the scores of their distinct texts (see distinct), as 
+		heapq.nlargest gives them from the heap of the whole window.
+		'''
+		scores = np.asarray(scores, dtype=np.float64)
+		maxpq = []
+		for sim, compStory in zip(scores[index].tolist(), neighbors):
+			heapq.heappush(maxpq, (sim, compStory))
+		return heapq.nlargest(self.num_closest, maxpq)
+
+	def distinct(self, story, neighbors):
+		'''
+		Returns the neighbors with distinct texts, and the position of the text 
+		of each one of neighbors among them: reprints have the same 
+		preprocessing, so the same score, and are only scored once. Whether 
+		story itself has a reprint in its window is found from the same table, 
+		and counted for the report. Stories without a digest (stored, or 
+		given their pre directly) are all scored.
+		'''
+		firsts, index, positions = [], [], dict()
+		digest = getattr(story, "digest", None)
+		for compStory in neighbors:
+			key = getattr(compStory, "digest", None) or id(compStory)
+			if key not in positions:
+				positions[key] = len(firsts)
+				firsts.append(compStory)
+			index.append(positions[key])
+		self.fastPath["stories"] += 1
+		self.fastPath["duplicates"] += digest is not None and digest in positions
+		self.fastPath["pairs"] += len(neighbors)
+		self.fastPath["shared"] += len(neighbors) - len(firsts)
+		return firsts, np.array(index, dtype=np.intp)
+
+	def similarityBatch(self, story, neighbors):
+		'''
+		Returns the similarity of story with each one of neighbors, in order, 
+		as a numpy array: the same as similaritytest(story, [compStory]) for 
+		each of them. This one calls similaritytest once per neighbour, 
+		measures that can score a whole window at once override it.
+		'''
+		return np.array([self.similaritytest(story, [compStory]) for compStory in neighbors], dtype=np.float64)
 
 	def stale(self, origStory, neighborStories):
 		'''
@@ -71,7 +194,47 @@ class Similarity:
 
 	def preprocessing(self, article):
 		"""
-		Function that gets run once on every article.
+		Function that gets run once on every article. An article with the same 
+		text as one of the last CONTENT_CACHE preprocessed by this worker 
+		reuses its preprocessing, without being tokenized again.
+		"""
+		article.digest = contentDigest(article.text)
+		self.fastPath["articles"] += 1
+		cached = self.contents.get(article.digest)
+		if cached is not None:
+			self.fastPath["reused"] += 1
+			self.restore(article, cached)
+			return
+		self.fromTokens(article, word_tokenize(article.text))
+		if len(self.contents) >= CONTENT_CACHE:
+			del self.contents[next(iter(self.contents))] # The oldest text
+		self.contents[article.digest] = self.keep(article)
+
+	def keep(self, article):
+		"""
+		Returns what preprocessing left on article, for the articles with the 
+		same text (see restore). Measures do not change a pre once it is made, 
+		so it can be shared.
+		"""
+		return article.pre, getattr(article, "norm", None), getattr(article, "weights", None)
+
+	def restore(self, article, kept):
+		"""
+		Gives article the preprocessing kept from an article with the same text.
+		"""
+		article.pre, article.norm, article.weights = kept
+
+	def fromTokens(self, article, tokens):
+		"""
+		Function that preprocesses an article given the tokens of its text, so 
+		that several measures can share one tokenization (see MultiSimilarity).
+		"""
+		raise NotImplementedError
+
+	def fromTerms(self, article, terms, counts):
+		"""
+		Function that can replace preprocessing for an article read from a TokenStore, 
+		given the ids of its stemmed words without stop words and their counts.
 		"""
 		raise NotImplementedError
 
@@ -82,6 +245,35 @@ class Similarity:
 		"""
 		raise NotImplementedError
 
+	def useStemTable(self, table):
+		"""
+		Starts the stem cache from a prebuilt word to stem table (see StemTable). 
+		Called in the parent before the workers start, they share the table 
+		instead of stemming every word again. Words missing from the table are 
+		stemmed when they are met, and counted for the report.
+		"""
+		self.wordDict = table
+		self.tableSize = len(table)
+
+	def report(self):
+		"""
+		Returns a summary of this worker's similarity test for the run report, or 
+		None if there is nothing to report.
+		"""
+		lines, counts = [], self.fastPath
+		if counts["articles"]:
+			if self.tableSize is not None:
+				lines.append(f"Stem table... {self.tableSize} words, {len(self.wordDict) - self.tableSize} stemmed on demand")
+			lines.append(f"Content cache... {counts['reused']} of {counts['articles']} articles reused the preprocessing of the same text")
+		if counts["stories"]:
+			lines.append(f"Duplicates... {counts['duplicates']} of {counts['stories']} stories had the same text in their window, "
+				f"{counts['shared']} of {counts['pairs']} scores reused")
+		if counts["candidates"]:
+			lines.append(f"Pruning... {counts['pruned']} of {counts['candidates']} candidates not scored "
+				f"({100 * counts['pruned'] / counts['candidates']:.1f}%, {counts['bounded']} before ties), "
+				f"{counts['ties']} of {counts['searches']} windows scored in full for ties")
+		return "\n".join(lines) or None
+
 
 class BoWSimularity(Similarity):
 
@@ -90,6 +282,7 @@ class BoWSimularity(Similarity):
 		self.stop_words = set(stopwords.words('english'))
 		self.wordDict = dict()
 		self.stemmer = PorterStemmer()
+		self.stemIds = dict()
 
 	def stem(self, tokenizedWords):
 		"""
@@ -115,8 +308,11 @@ class BoWSimularity(Similarity):
 				filtered.add(word)
 		return filtered
 
-	def preprocessing(self, article):
-		article.pre = self.stop(self.stem(word_tokenize(article.text)))
+	def fromTokens(self, article, tokens):
+		article.pre = self.stop(self.stem(tokens))
+
+	def fromTerms(self, article, terms, counts):
+		article.pre = set(terms)
 
 	def similaritytest(self, orig, others):
 		"""
@@ -127,6 +323,208 @@ class BoWSimularity(Similarity):
 		A = orig.pre.intersection(B)
 		return len(A) / len(orig.pre)
 
+	def termArray(self, story):
+		"""
+		Returns the stems of story as the sorted array of their ids in this 
+		process, given in order of first appearance. It is made the first 
+		time a story is scored and kept on its record, for all the windows 
+		it is part of.
+		"""
+		ids = getattr(story, "ids", None)
+		if ids is None:
+			ids = np.fromiter((self.stemIds.setdefault(t, len(self.stemIds)) for t in story.pre), dtype=np.uint32, count=len(story.pre))
+			ids.sort()
+			story.ids = ids
+		return ids
+
+	def similarityBatch(self, story, neighbors):
+		"""
+		Scores story against its whole window with one numpy pass over the 
+		concatenated term arrays of the neighbours (see term_ids.overlaps).
+		"""
+		found = overlaps(self.termArray(story), [self.termArray(compStory) for compStory in neighbors])
+		return found / len(story.pre)
+
+class IndexedBoWSimularity(BoWSimularity):
+	"""
+	BoWSimularity that scores a story from postings: the linked list of each 
+	ticker keeps, for every stem of its stories, the set of the stories that 
+	have it (see IndexedList), updated as stories are added and cut. The 
+	overlaps of a story with all of its window then take one pass over the 
+	postings of its own stems, instead of one intersection per neighbour, 
+	and so does Old(s). Scores are the same as BoWSimularity. Within a 
+	MultiSimilarity, which keeps the windows itself, it scores pair by pair.
+	With prune, the closest are found with a pruned search, see closest.
+	"""
+
+	def __init__(self, num_closest = 5, old_news = 0.6, reprint = 0.8, look_back_days = 5, prune = False):
+		super().__init__(num_closest, old_news, reprint, look_back_days)
+		self.index = None
+		self.prune = prune
+
+	def newWindow(self):
+		return IndexedList(lambda story: story.pre)
+
+	def window(self, story, companyLL):
+		self.index = companyLL # Compared next, after story is added to it
+		return super().window(story, companyLL)
+
+	def similarityBatch(self, story, neighbors):
+		if self.index is None:
+			return super().similarityBatch(story, neighbors)
+		counts = self.index.overlaps(story.pre)
+		return np.array([counts[compStory] for compStory in neighbors], dtype=np.float64) / len(story.pre)
+
+	def similaritytest(self, orig, others):
+		if self.index is None:
+			return super().similaritytest(orig, others)
+		return self.index.unionOverlap(orig.pre, others) / len(orig.pre)
+
+	def closest(self, story, neighbors):
+		'''
+		With prune, only the distinct texts of the window that can be among the 
+		num_closest are scored. A neighbour can not share more stems than the 
+		shorter of the two stories has, min(|A|, |B|), so the neighbours are 
+		scored in the order of this bound, and the search stops once the bound 
+		is below the num_closest-th best overlap found so far. Only the 
+		neighbours found in the postings of the rarest |A| - t + 1 stems of the 
+		story are looked at (prefix filtering), t being the num_closest-th best 
+		overlap of the num_closest neighbours with the highest bounds: the 
+		others share at most t - 1 of its stems. 
+
+		heapq.nlargest breaks ties in an order that depends on every score of 
+		the window, so if equal scores could change the two closest, or the 
+		texts among the num_closest, the neighbours not scored are scored after 
+		all and the heap is built as without prune. Else the columns are the 
+		same: the same two closest and the same texts, the others may come in 
+		another order.
+		'''
+		if not self.prune or self.index is None or not story.pre:
+			return super().closest(story, neighbors)
+		firsts, index = self.distinct(story, neighbors)
+		k, A = self.num_closest, story.pre
+		if len(firsts) <= k:
+			return self.largest(self.similarityBatch(story, firsts), index, neighbors)
+		bounds = np.minimum(np.fromiter((len(s.pre) for s in firsts), dtype=np.int64, count=len(firsts)), len(A))
+		weights = np.bincount(index, minlength=len(firsts)) # Reprints of each text
+		counts = np.full(len(firsts), -1, dtype=np.int64) # Overlaps, -1 if not scored
+		best = [] # The k best overlaps of the neighbours scored so far, a min-heap
+
+		def score(i):
+			counts[i] = len(A.intersection(firsts[i].pre))
+			for _ in range(min(weights[i], k)):
+				if len(best) < k:
+					heapq.heappush(best, counts[i])
+				elif counts[i] > best[0]:
+					heapq.heapreplace(best, counts[i])
+
+		order = np.argsort(-bounds, kind="stable")
+		for i in order[:k].tolist():
+			score(i)
+		rare = sorted(A, key=lambda term: len(self.index.postings.get(term, ())))
+		found = set()
+		for term in rare[:len(A) - best[0] + 1]:
+			found.update(self.index.postings.get(term, ()))
+		position = {id(compStory): i for i, compStory in enumerate(firsts)}
+		candidates = sorted((position[id(s)] for s in found if id(s) in position), key=lambda i: -bounds[i])
+		for i in candidates:
+			if bounds[i] < best[0]:
+				break
+			if counts[i] < 0:
+				score(i)
+
+		self.fastPath["searches"] += 1
+		self.fastPath["candidates"] += len(firsts)
+		self.fastPath["bounded"] += int(np.count_nonzero(counts < 0))
+		ranked = np.sort(np.repeat(counts, weights))[::-1][:k + 1]
+		boundary = ranked[k - 1] == ranked[k] if len(ranked) > k else False
+		if boundary:
+			boundary = np.count_nonzero(counts == ranked[k - 1]) > 1 # Reprints of one text have the same stems
+		ties = best[0] == 0 or ranked[0] == ranked[1] or (k > 2 and ranked[1] == ranked[2]) or boundary
+		if not ties:
+			self.fastPath["pruned"] += int(np.count_nonzero(counts < 0))
+			scores = counts[index]
+			top = np.argsort(-scores, kind="stable")[:k]
+			return [(scores[i].item() / len(A), neighbors[i]) for i in top.tolist()]
+		self.fastPath["ties"] += 1
+		for i in np.flatnonzero(counts < 0).tolist():
+			counts[i] = len(A.intersection(firsts[i].pre))
+		return self.largest(counts / len(A), index, neighbors)
+
+class HashedBoWSimularity(BoWSimularity):
+	"""
+	BoWSimularity over stable term ids (see measures/term_ids.py): the stemmed 
+	words of an article are kept as the sorted numpy array of their ids, which 
+	are the same in every supplier. These arrays are what is pickled to the 
+	processors and held in the linked lists, instead of sets of strings. 
+	Scores are the same as BoWSimularity unless two stems collide, see report.
+	"""
+
+	def __init__(self, num_closest = 5, old_news = 0.6, reprint = 0.8, look_back_days = 5, bits = TERM_BITS):
+		super().__init__(num_closest, old_news, reprint, look_back_days)
+		self.termIds = TermIds(bits)
+
+	def fromTokens(self, article, tokens):
+		super().fromTokens(article, tokens)
+		article.pre = self.termIds.array(article.pre)
+
+	def fromTerms(self, article, terms, counts):
+		article.pre = np.array(terms, dtype=self.termIds.dtype) # Store ids are already sorted
+
+	def similaritytest(self, orig, others):
+		return overlap(orig.pre, union([story.pre for story in others])) / len(orig.pre)
+
+	def similarityBatch(self, story, neighbors):
+		return overlaps(story.pre, [compStory.pre for compStory in neighbors]) / len(story.pre)
+
+	def report(self):
+		terms = self.termIds.report() if self.termIds.ids else None # Processors only get ids
+		return "\n".join(r for r in (super().report(), terms) if r) or None
+
+class ArraySimularity(HashedBoWSimularity):
+	"""
+	HashedBoWSimularity on sorted uint32 arrays. Each processor renumbers the 
+	stable ids sent by the suppliers into its own dense ids, in order of first 
+	appearance, so the arrays it keeps are half the size without any new 
+	collision. A story is scored against its whole window in one pass (see 
+	term_ids.overlaps). With bitmaps, a story also keeps its ids as the bits 
+	of a Python int, and is scored by and-ing them, which is fastest while 
+	the processor has seen few distinct terms.
+	"""
+
+	def __init__(self, num_closest = 5, old_news = 0.6, reprint = 0.8, look_back_days = 5, bits = TERM_BITS, bitmaps = False):
+		super().__init__(num_closest, old_news, reprint, look_back_days, bits)
+		self.bitmaps = bitmaps
+		self.localIds = dict()
+
+	def localize(self, article):
+		"""
+		Renumbers the ids of an article that has just reached this processor, 
+		once. Warm-up articles are only renumbered when they are first compared.
+		"""
+		if getattr(article, "bits", None) is not None:
+			return
+		local = [self.localIds.setdefault(i, len(self.localIds)) for i in article.pre.tolist()]
+		article.pre = np.sort(np.array(local, dtype=np.uint32))
+		article.bits = bitmap(article.pre) if self.bitmaps else 0
+
+	def compare(self, story, neighbors):
+		[self.localize(s) for s in [story] + neighbors] # Reprints are not all scored
+		return super().compare(story, neighbors)
+
+	def similarityBatch(self, story, neighbors):
+		if self.bitmaps:
+			return np.array([(story.bits & compStory.bits).bit_count() for compStory in neighbors], dtype=np.float64) / len(story.pre)
+		return super().similarityBatch(story, neighbors)
+
+	def similaritytest(self, orig, others):
+		if self.bitmaps:
+			B = 0
+			for story in others:
+				B |= story.bits
+			return (orig.bits & B).bit_count() / len(orig.pre)
+		return super().similaritytest(orig, others)
+
 class CosineSimilarity(Similarity):
 	def __init__(self, num_closest = 5, old_news = 0.6, reprint = 0.8, look_back_days = 5):
 		super().__init__(num_closest, old_news, reprint, look_back_days)
@@ -158,10 +556,14 @@ class CosineSimilarity(Similarity):
 				filtered[word] += 1
 		return filtered
 
-	def preprocessing(self, article):
-		article.pre = self.stop(self.stem(word_tokenize(article.text)))
+	def fromTokens(self, article, tokens):
+		article.pre = self.stop(self.stem(tokens))
 		article.norm = np.sqrt(np.sum([np.square(article.pre[key]) for key in article.pre]))
 
+	def fromTerms(self, article, terms, counts):
+		article.pre = Counter(dict(zip(terms, counts)))
+		article.norm = np.sqrt(np.sum([np.square(count) for count in counts]))
+
 	def similaritytest(self, orig, others):
 		"""
 		Calculates Old(s) and ClosestNeighbor(s), where s is curr_article. 
@@ -194,4 +596,230 @@ class CosineSimilarity(Similarity):
 		temp1 = orig.norm
 		
 
-		return sim / (temp1 * temp2)
\ No newline at end of file
+		return sim / (temp1 * temp2)
+
+class SparseCosineSimilarity(CosineSimilarity):
+	"""
+	CosineSimilarity on sparse vectors: the pre of a story is the sorted array 
+	of the stable ids of its stems (see term_ids.py), its weights the parallel 
+	array of their counts, and its norm is computed once. Dot products are 
+	taken by matching the sorted ids, the union of the closest stories is 
+	summed from their arrays, and a story is scored against its whole window 
+	in one numpy pass. The counts are whole numbers, so the scores are those 
+	of CosineSimilarity, barring collisions of the ids.
+	"""
+
+	def __init__(self, num_closest = 5, old_news = 0.6, reprint = 0.8, look_back_days = 5, bits = TERM_BITS):
+		super().__init__(num_closest, old_news, reprint, look_back_days)
+		self.termIds = TermIds(bits)
+
+	def vector(self, article, ids, counts):
+		order = np.argsort(ids)
+		article.pre = ids[order]
+		article.weights = counts[order]
+		article.norm = np.sqrt(np.dot(article.weights, article.weights))
+
+	def fromTokens(self, article, tokens):
+		counts = self.stop(self.stem(tokens))
+		ids = np.fromiter((self.termIds.id(t) for t in counts), dtype=self.termIds.dtype, count=len(counts))
+		self.vector(article, ids, np.fromiter(counts.values(), dtype=np.float64, count=len(counts)))
+
+	def fromTerms(self, article, terms, counts):
+		self.vector(article, np.array(terms, dtype=self.termIds.dtype), np.array(counts, dtype=np.float64))
+
+	def similaritytest(self, orig, others):
+		if len(others) > 1:
+			ids, inverse = np.unique(np.concatenate([story.pre for story in others]), return_inverse=True)
+			weights = np.bincount(inverse, weights=np.concatenate([story.weights for story in others]), minlength=len(ids))
+			norm = np.sqrt(np.dot(weights, weights))
+		else:
+			ids, weights, norm = others[0].pre, others[0].weights, others[0].norm
+		if len(ids) == 0:
+			return 0 / (orig.norm * norm)
+		positions = np.searchsorted(ids, orig.pre)
+		positions[positions == len(ids)] = 0
+		found = ids[positions] == orig.pre
+		return np.dot(orig.weights[found], weights[positions[found]]) / (orig.norm * norm)
+
+	def similarityBatch(self, story, neighbors):
+		if len(story.pre) == 0:
+			return np.full(len(neighbors), np.nan) # 0 / 0, as in CosineSimilarity
+		if not neighbors:
+			return np.zeros(0)
+		lengths = [len(compStory.pre) for compStory in neighbors]
+		ids = np.concatenate([compStory.pre for compStory in neighbors])
+		positions = np.searchsorted(story.pre, ids)
+		positions[positions == len(story.pre)] = 0
+		products = np.where(story.pre[positions] == ids, story.weights[positions] * np.concatenate([compStory.weights for compStory in neighbors]), 0)
+		dots = np.bincount(np.repeat(np.arange(len(neighbors)), lengths), weights=products, minlength=len(neighbors))
+		return dots / (story.norm * np.array([compStory.norm for compStory in neighbors]))
+
+	def report(self):
+		terms = self.termIds.report() if self.termIds.ids else None # Processors only get ids
+		return "\n".join(r for r in (super().report(), terms) if r) or None
+
+
+class WinnowingSimilarity(Similarity):
+	"""
+	Verbatim overlap: the fingerprints of a story are the winnowed hashes of 
+	the sequences of k tokens of its text (lower case, in order), the smallest 
+	of every w consecutive ones. A passage of at least w + k - 1 tokens that 
+	two stories share gives them at least one fingerprint in common, while the 
+	same words in another order give them none. A story scores the fraction of 
+	its fingerprints found in a neighbor, about the share of its text copied 
+	from it. The pre of a story is the sorted array of its fingerprints.
+
+	The linked list of each ticker keeps, for every fingerprint, the stories 
+	that have it (see IndexedList), so the closest of a story are found from 
+	the postings of its own fingerprints, and only the stories with one of 
+	them are scored. Within a MultiSimilarity, which keeps the windows itself, 
+	the whole window is scored. Either way the closest are the same (see 
+	closest). Needs the tokens in order, so it can not run from a token store.
+	"""
+
+	hasTerms = False
+
+	def __init__(self, num_closest = 5, old_news = 0.6, reprint = 0.8, look_back_days = 5, k = 5, w = 4):
+		super().__init__(num_closest, old_news, reprint, look_back_days)
+		self.k = k
+		self.w = w
+		self.termIds = TermIds()
+		self.index = None
+
+	def fromTokens(self, article, tokens):
+		ids = np.fromiter((self.termIds.id(t.lower()) for t in tokens), dtype=np.uint64, count=len(tokens))
+		if len(ids) == 0:
+			article.pre = ids
+			return
+		k = min(self.k, len(ids))
+		hashes = np.zeros(len(ids) - k + 1, dtype=np.uint64)
+		with np.errstate(over="ignore"):
+			for j in range(k): # Polynomial hash of each sequence of k ids, modulo 2 ** 64
+				hashes = hashes * np.uint64(1000003) + ids[j:len(ids) - k + 1 + j]
+		if len(hashes) > self.w:
+			windows = sliding_window_view(hashes, self.w)
+			hashes = hashes[np.unique(np.arange(len(windows)) + self.w - 1 - np.argmin(windows[:, ::-1], axis=1))] # The rightmost smallest
+		else:
+			hashes = hashes[[np.argmin(hashes)]]
+		article.pre = np.unique(hashes)
+
+	def newWindow(self):
+		return IndexedList(lambda story: story.pre.tolist())
+
+	def window(self, story, companyLL):
+		self.index = companyLL # Compared next, after story is added to it
+		return super().window(story, companyLL)
+
+	def closest(self, story, neighbors):
+		'''
+		Returns the (score, story) of the num_closest highest scored neighbors 
+		that share a passage with story, highest first, and in the order of the 
+		window (most recent first) when their scores are equal. Without any 
+		passage in common, story has no closest.
+		'''
+		if self.index is None:
+			scores = self.similarityBatch(story, neighbors)
+			found = np.flatnonzero(scores > 0)
+			scores = scores[found]
+		else:
+			counts = self.index.overlaps(story.pre.tolist())
+			positions = {id(compStory): i for i, compStory in enumerate(neighbors)}
+			hits = sorted((positions[id(compStory)], count) for compStory, count in counts.items() if id(compStory) in positions)
+			found = np.array([i for i, _ in hits], dtype=np.intp)
+			scores = np.array([count for _, count in hits], dtype=np.float64) / len(story.pre)
+		top = np.lexsort((found, -scores))[:self.num_closest]
+		return [(score, neighbors[i]) for score, i in zip(scores[top].tolist(), found[top].tolist())]
+
+	def similaritytest(self, orig, others):
+		if self.index is None:
+			return overlap(orig.pre, union([story.pre for story in others])) / len(orig.pre)
+		return self.index.unionOverlap(orig.pre.tolist(), others) / len(orig.pre)
+
+	def similarityBatch(self, story, neighbors):
+		return overlaps(story.pre, [compStory.pre for compStory in neighbors]) / len(story.pre)
+
+	def report(self):
+		terms = self.termIds.report() if self.termIds.ids else None # Processors only get fingerprints
+		return "\n".join(r for r in (super().report(), terms) if r) or None
+
+
+class MultiSimilarity(Similarity):
+	"""
+	Several measures run in one pass. Each article is tokenized once and 
+	preprocessed by every measure, into its own record (see StoryRecord): the 
+	pre of the article is the list of these records, one per measure. The 
+	articles share one window per ticker, of the longest look back, and each 
+	measure scores the part of it within its own look back. The rows have a 
+	group of MEASURE_COLUMNS per measure, prefixed by its name.
+	"""
+
+	def __init__(self, measures, names = None):
+		super().__init__(look_back_days = 0)
+		self.measures = list(measures)
+		self.names = list(names or [type(m).__name__ for m in self.measures])
+		self.look_back = max(m.look_back for m in self.measures)
+		self.wordDict = dict()
+		for m in self.measures: # One stem cache for all of them
+			if hasattr(m, "wordDict"):
+				m.wordDict = self.wordDict
+
+	def measureColumns(self):
+		return [f"{name}_{column}" for name in self.names for column in MEASURE_COLUMNS]
+
+	def terms(self, story):
+		'''
+		Returns the terms of the first measure that has some (see hasTerms), 
+		else the fingerprints of the first one.
+		'''
+		for m, view in zip(self.measures, story.pre):
+			if m.hasTerms:
+				return m.terms(view)
+		return self.measures[0].terms(story.pre[0])
+
+	def fromTokens(self, article, tokens):
+		views = []
+		for m in self.measures:
+			article.norm, article.weights = None, None # Not left over from the previous measure
+			if type(m).fromTokens is Similarity.fromTokens:
+				m.preprocessing(article)
+			else:
+				m.fromTokens(article, tokens)
+			views.append(article.record())
+		article.pre, article.norm, article.weights = views, None, None
+
+	def keep(self, article):
+		return [(view.pre, view.norm, view.weights) for view in article.pre]
+
+	def restore(self, article, kept):
+		views = []
+		for pre, norm, weights in kept:
+			article.pre, article.norm, article.weights = pre, norm, weights
+			views.append(article.record())
+		article.pre, article.norm, article.weights = views, None, None
+
+	def fromTerms(self, article, terms, counts):
+		views = []
+		for m in self.measures:
+			article.norm, article.weights = None, None
+			m.fromTerms(article, terms, counts)
+			views.append(article.record())
+		article.pre, article.norm, article.weights = views, None, None
+
+	def compare(self, story, neighbors):
+		row = []
+		for i, m in enumerate(self.measures):
+			view = story.pre[i]
+			row += m.compare(view, [n.pre[i] for n in neighbors if view.displayDate - n.displayDate <= m.look_back])
+		return row
+
+	def useStemTable(self, table):
+		self.wordDict = table
+		self.tableSize = len(table)
+		for m in self.measures:
+			if hasattr(m, "wordDict"):
+				m.useStemTable(table)
+
+	def report(self):
+		reports = [m.report() for m in self.measures]
+		lines = [super().report()] + [f"{name}: {r}" for name, r in zip(self.names, reports) if r]
+		return "\n".join(r for r in lines if r) or None
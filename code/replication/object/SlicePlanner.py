@@ -0,0 +1,67 @@
+"""
+Plans balanced time slices of a corpus for parallel runs.
+
+Splitting the work one task per nml file lets the largest file decide the run
+time. Instead, all articles with tickers are put in one chronological sequence
+(from the byte-offset indexes) and cut into slices with about the same number
+of articles, whatever the file boundaries. Each slice carries a warm-up prefix,
+the articles of the look back window before its first article, which are only
+added to the per ticker linked lists so that their state at the start of the
+slice is the same as in a sequential run.
+"""
+
+from collections import namedtuple
+
+from NMLIndex import loadIndex, withTickers, indexedGetter
+
+Slice = namedtuple("Slice", ["warmup", "start", "end"])
+
+
+def corpusEntries(filenames, index_dir=None):
+	'''
+	Returns the (filename, IndexEntry) pairs of every article with tickers in
+	filenames, in order. The indexes must exist (see NMLIndex.ensureIndexes).
+	'''
+	return [(f, e) for f in filenames for e in withTickers(loadIndex(f, index_dir))]
+
+
+def warmupStart(entries, start, look_back):
+	'''
+	Returns the position of the first article of the warm-up of a slice that
+	begins at start: walking back from start, every article displayed within
+	look_back seconds of the first article of the slice.
+	'''
+	if start >= len(entries):
+		return start
+	first = entries[start][1].date
+	w = start
+	while w > 0 and first - entries[w - 1][1].date <= look_back:
+		w -= 1
+	return w
+
+
+def planSlices(entries, slice_count, look_back):
+	'''
+	Cuts entries into at most slice_count slices of about the same number of
+	articles. Returns a list of Slice, positions into entries: the warm-up is
+	entries[warmup:start] and the slice itself entries[start:end].
+	'''
+	slice_count = max(1, min(slice_count, len(entries)))
+	bounds = [len(entries) * i // slice_count for i in range(slice_count + 1)]
+	return [Slice(warmupStart(entries, bounds[i], look_back), bounds[i], bounds[i + 1])
+		for i in range(slice_count)]
+
+
+def sliceGetter(entries):
+	'''
+	A getter for the articles of a list of (filename, IndexEntry) pairs, in
+	order, returning the bytes of each one as a memoryview (see indexedGetter).
+	'''
+	i = 0
+	while i < len(entries):
+		f = entries[i][0]
+		j = i
+		while j < len(entries) and entries[j][0] == f:
+			j += 1
+		yield from indexedGetter(f, [e for _, e in entries[i:j]])
+		i = j
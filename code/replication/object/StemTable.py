@@ -0,0 +1,74 @@
+"""
+Prebuilt word to stem table of a corpus.
+
+The suppliers each fill their own stem cache from empty, so the Porter stemmer
+runs again for the same word in every one of them. Instead, a pre-pass collects
+the distinct words of the articles with tickers (one task per nml file),
+stems each of them once (in chunks, in parallel) and saves the table as a
+text file of word, tab, stem lines, sorted by word. The procedures load it in
+the parent before the workers are started, and the workers inherit it (see
+Similarity.useStemTable).
+"""
+
+import sys
+from multiprocessing import Pool, cpu_count
+
+from nltk.stem.porter import PorterStemmer
+
+from Article import Article
+from NMLReader import docGetter, nmlFiles
+from tokenizer import word_tokenize
+
+STEM_CHUNK = 10000
+
+
+def corpusWords(filename):
+	'''Returns the set of distinct words of the articles with tickers of one nml file.'''
+	words = set()
+	for doc in docGetter(filename):
+		story = Article(doc)
+		if story.bad or story.tickers == []:
+			continue
+		words.update(word_tokenize(story.text))
+	return words
+
+
+def stemWords(words):
+	'''Returns the list of (word, stem) pairs of words.'''
+	stemmer = PorterStemmer()
+	return [(word, stemmer.stem(word)) for word in words]
+
+
+def buildStemTable(startlocation='data', tablelocation='stems.tsv', worker_count=-1):
+	'''
+	Builds the stem table of all nml files from startlocation (plain,
+	compressed or archived) at tablelocation. Returns the number of words.
+	'''
+	if worker_count < 0:
+		worker_count += cpu_count() + 1
+	location = nmlFiles(startlocation)
+	words = set()
+	with Pool(max(1, worker_count)) as pool:
+		for f, part in zip(location, pool.imap(corpusWords, location, chunksize=1)):
+			print("File read...", f)
+			words.update(part)
+		words = sorted(words)
+		chunks = [words[i:i + STEM_CHUNK] for i in range(0, len(words), STEM_CHUNK)]
+		with open(tablelocation, 'w', encoding="utf-8") as tableFile:
+			for pairs in pool.imap(stemWords, chunks):
+				tableFile.writelines(f"{word}\t{stem}\n" for word, stem in pairs)
+	return len(words)
+
+
+def loadStemTable(tablelocation):
+	'''Returns the word to stem dict saved at tablelocation.'''
+	with open(tablelocation, encoding="utf-8") as tableFile:
+		return dict(line.split("\t") for line in tableFile.read().splitlines())
+
+
+if __name__ == '__main__':
+	if len(sys.argv) == 3:
+		print(buildStemTable(sys.argv[1], sys.argv[2]), "words stemmed")
+	else:
+		print("Usage: python StemTable.py nml_directory table_file")
+		sys.exit(1)
@@ -0,0 +1,213 @@
+"""
+Pre-parsed, array backed store of the preprocessed articles of a corpus.
+
+Building the store parses, tokenizes, stems and removes the stop words of
+every article with tickers once. Each column is written to its own flat
+binary file in the store directory, and meta.json records their lengths:
+
+	dates          float64, display date of each article (seconds since the epoch)
+	id_offsets     int64, n + 1 offsets of each accession number into ids
+	ids            uint8, the utf-8 accession numbers, one after another
+	ticker_offsets int64, n + 1 offsets of each article into tickers
+	tickers        int32, ticker ids, lines of tickers.txt
+	term_offsets   int64, n + 1 offsets of each article into terms and counts
+	terms          int32, sorted ids of the distinct terms, lines of vocabulary.txt
+	counts         int32, number of times each term occurs in its article
+
+Loading maps the columns into memory, so reruns of the procedure with other
+Similarity parameters skip the XML and NLTK work entirely (see
+Similarity.fromTerms). The terms are those of CosineSimilarity.preprocessing,
+whose keys are also the words of BoWSimularity.preprocessing.
+"""
+
+import json
+import os
+import sys
+from multiprocessing import Pool, cpu_count
+
+import numpy as np
+
+from Article import Article
+from NMLReader import docGetter, nmlFiles
+from Similarity import CosineSimilarity
+from tokenizer import word_tokenize
+
+STORE_VERSION = "tokenstore-1"
+META = "meta.json"
+VOCABULARY = "vocabulary.txt"
+TICKERS = "tickers.txt"
+COLUMNS = {"dates": np.float64, "id_offsets": np.int64, "ids": np.uint8, "ticker_offsets": np.int64,
+	"tickers": np.int32, "term_offsets": np.int64, "terms": np.int32, "counts": np.int32}
+
+
+class StoredArticle(Article):
+	"""
+	An article read back from a TokenStore. It has no headline or text, only
+	the features the procedure needs.
+	"""
+
+	def __init__(self, accessionNumber, displayDate, tickers):
+		self.accessionNumber = accessionNumber
+		self.displayDate = displayDate
+		self.tickers = tickers
+		self.headline = None
+		self.text = None
+		self.bad = False
+		self.skipped = None
+		self.warmup = False
+
+
+def isStore(location):
+	'''Returns True if location is a token store directory.'''
+	return os.path.isfile(os.path.join(location, META))
+
+
+def tokenizeFile(filename):
+	'''
+	Preprocesses every article with tickers of one nml file. Returns the words
+	(local vocabulary) and the columns of the file, with term ids local to it.
+	'''
+	tokenizer = CosineSimilarity()
+	words, ids, dates, tickers = dict(), list(), list(), list()
+	terms, counts, offsets = list(), list(), [0]
+	for doc in docGetter(filename):
+		story = Article(doc)
+		if story.bad or story.tickers == []:
+			continue
+		pre = tokenizer.stop(tokenizer.stem(word_tokenize(story.text)))
+		ids.append(story.accessionNumber)
+		dates.append(story.displayDate)
+		tickers.append(story.tickers)
+		for word, count in pre.items():
+			terms.append(words.setdefault(word, len(words)))
+			counts.append(count)
+		offsets.append(len(terms))
+	return list(words), ids, dates, tickers, np.array(terms, dtype=np.int32), np.array(counts, dtype=np.int32), np.array(offsets, dtype=np.int64)
+
+
+def buildStore(startlocation='data', storelocation='token_store', worker_count=-1):
+	'''
+	Builds the token store of all nml files from startlocation (plain,
+	compressed or archived) at storelocation, one file per task. Returns the
+	number of articles stored.
+	'''
+	if worker_count < 0:
+		worker_count += cpu_count() + 1
+	os.makedirs(storelocation, exist_ok=True)
+	location = nmlFiles(startlocation)
+	vocabulary, tickerIds = dict(), dict()
+	sizes = dict.fromkeys(COLUMNS, 0)
+	outputs = {name: open(os.path.join(storelocation, name + ".bin"), 'wb') for name in COLUMNS}
+	ends = {"id_offsets": 0, "ticker_offsets": 0, "term_offsets": 0}
+
+	def write(name, values):
+		values = np.asarray(values, dtype=COLUMNS[name])
+		values.tofile(outputs[name])
+		sizes[name] += len(values)
+
+	[write(name, [0]) for name in ends]
+	with Pool(max(1, worker_count)) as pool:
+		for f, part in zip(location, pool.imap(tokenizeFile, location, chunksize=1)):
+			print("File stored...", f)
+			words, ids, dates, tickers, terms, counts, offsets = part
+			remap = np.array([vocabulary.setdefault(w, len(vocabulary)) for w in words], dtype=np.int32)
+			terms = remap[terms]
+			article = np.repeat(np.arange(len(ids)), np.diff(offsets))
+			order = np.lexsort((terms, article)) # Sorted terms within each article
+			encoded = [i.encode("utf-8") for i in ids]
+			write("dates", dates)
+			write("ids", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+			write("id_offsets", ends["id_offsets"] + np.cumsum([len(i) for i in encoded]))
+			write("tickers", [tickerIds.setdefault(t, len(tickerIds)) for ts in tickers for t in ts])
+			write("ticker_offsets", ends["ticker_offsets"] + np.cumsum([len(ts) for ts in tickers]))
+			write("terms", terms[order])
+			write("counts", counts[order])
+			write("term_offsets", ends["term_offsets"] + offsets[1:])
+			ends = {name: sizes[base] for name, base in
+				(("id_offsets", "ids"), ("ticker_offsets", "tickers"), ("term_offsets", "terms"))}
+	[out.close() for out in outputs.values()]
+
+	with open(os.path.join(storelocation, VOCABULARY), 'w', encoding="utf-8") as vocabFile:
+		vocabFile.writelines(w + "\n" for w in vocabulary)
+	with open(os.path.join(storelocation, TICKERS), 'w', encoding="utf-8") as tickerFile:
+		tickerFile.writelines(t + "\n" for t in tickerIds)
+	with open(os.path.join(storelocation, META), 'w') as metaFile:
+		json.dump({"version": STORE_VERSION, "sources": location, "sizes": sizes}, metaFile, indent=1)
+	return sizes["dates"]
+
+
+class TokenStore:
+	"""
+	A token store opened for reading. The columns are memory mapped numpy
+	arrays, named as in COLUMNS.
+	"""
+
+	def __init__(self, location):
+		with open(os.path.join(location, META)) as metaFile:
+			meta = json.load(metaFile)
+		if meta["version"] != STORE_VERSION:
+			raise ValueError(f"{location} is not a {STORE_VERSION} store")
+		self.location = location
+		self.sources = meta["sources"]
+		for name, dtype in COLUMNS.items():
+			size = meta["sizes"][name]
+			path = os.path.join(location, name + ".bin")
+			column = np.memmap(path, dtype=dtype, mode='r', shape=(size,)) if size else np.empty(0, dtype=dtype)
+			setattr(self, name, column)
+		with open(os.path.join(location, TICKERS), encoding="utf-8") as tickerFile:
+			self.tickerNames = tickerFile.read().splitlines()
+		self.vocabulary = None
+
+	def __len__(self):
+		return len(self.dates)
+
+	def words(self):
+		'''Returns the list of terms, loaded on first use, indexed by term id.'''
+		if self.vocabulary is None:
+			with open(os.path.join(self.location, VOCABULARY), encoding="utf-8") as vocabFile:
+				self.vocabulary = vocabFile.read().splitlines()
+		return self.vocabulary
+
+	def story(self, i):
+		'''Returns the StoredArticle at position i, without its terms.'''
+		return StoredArticle(self.ids[self.id_offsets[i]:self.id_offsets[i + 1]].tobytes().decode("utf-8"),
+			float(self.dates[i]),
+			[self.tickerNames[t] for t in self.tickers[self.ticker_offsets[i]:self.ticker_offsets[i + 1]]])
+
+	def termCounts(self, i):
+		'''Returns the ids of the terms of the article at position i and their counts, as lists.'''
+		start, end = self.term_offsets[i], self.term_offsets[i + 1]
+		return self.terms[start:end].tolist(), self.counts[start:end].tolist()
+
+	def article(self, i):
+		'''
+		Returns the StoredArticle at position i, with the ids of its terms and
+		their counts as lists.
+		'''
+		return (self.story(i),) + tuple(self.termCounts(i))
+
+	def stories(self, simtest, start=0, end=None, docFilter=None):
+		'''
+		A getter for the records (see StoryRecord) of the articles from start to 
+		end, preprocessed for simtest from their stored terms. Articles rejected by docFilter (see DocFilter) 
+		are counted and skipped before their terms are read.
+		'''
+		for i in range(start, len(self) if end is None else end):
+			story = self.story(i)
+			if docFilter is not None:
+				story.tickers = docFilter.keep(story.displayDate, story.tickers)
+				if not story.tickers:
+					docFilter.count("store", docFilter.reason)
+					continue
+				story.warmup = docFilter.isWarmup(story.displayDate)
+			terms, counts = self.termCounts(i)
+			simtest.fromTerms(story, terms, counts)
+			yield story.record()
+
+
+if __name__ == '__main__':
+	if len(sys.argv) == 3:
+		print(buildStore(sys.argv[1], sys.argv[2]), "articles stored")
+	else:
+		print("Usage: python TokenStore.py nml_directory store_directory")
+		sys.exit(1)
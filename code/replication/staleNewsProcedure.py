@@ -10,11 +10,9 @@ Understanding the mere size of the number of articles published in a day, and th
 import xml.etree.ElementTree as ET
 import re
 from nltk.corpus import stopwords 
-from nltk.tokenize import word_tokenize
 import nltk
 from nltk.stem.porter import *
 from pytz import timezone
-import dateutil.parser
 import datetime
 import heapq
 import numpy as np
@@ -23,8 +21,20 @@ import sys
 import os
 import time
 import multiprocessing as mp
+from collections import Counter
+from functools import partial
 
 import glob
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'object'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'measures'))
+from NMLReader import docSlices
+from NMLIndex import ensureIndexes
+from SlicePlanner import corpusEntries, planSlices, sliceGetter
+from timestamps import parse_epoch
+from tokenizer import word_tokenize
+from term_ids import TermIds
+
 fs = glob.glob('data/*.nml')
 
 #line below needs to be run at least once.
@@ -32,78 +42,17 @@ fs = glob.glob('data/*.nml')
 eastern = timezone('US/Eastern')
 stop_words = set(stopwords.words('english')) 
 stemmer = PorterStemmer()
-stemDict = dict() # dict from stem to index, for faster set comparisons
+termIds = TermIds() # stable ids of the stems, the same in every process
 wordDict = dict() # dict from word to stem
+HEADER = ['DATE_EST', 'STORY_ID', 'TICKER', 'HEADLINE', 'STORY_LENGTH', 'CLOSEST_ID', 'SECOND_CLOSEST_ID', 'CLOSEST_SCORE', 'TOTAL_OVERLAP', 'IS_OLD', 'IS_REPRINT', 'IS_RECOMB']
 
 #Key functions
 def xmlTreeGetter(filename="2001_sample_10M.nml"):
     '''A getter function for each article. When next is called, it will return the next article. 
     The files are split by the </doc> tag, which is at the end of every article.'''
-    nmlFile = open(filename)
-    text = ""
-    for i, line in enumerate(nmlFile):
-        text += line
-        if "</doc>" in line:
-            yield ET.fromstring(text)
-            text = ""
-
-
-def reverse_readline(filename, buf_size=81920000):
-    """A generator that returns the lines of a file in reverse order
-    https://stackoverflow.com/questions/2301789/read-a-file-in-reverse-order-using-python"""
-    with open(filename) as fh:
-        segment = None
-        offset = 0
-        fh.seek(0, os.SEEK_END)
-        file_size = remaining_size = fh.tell()
-        while remaining_size > 0:
-            offset = min(file_size, offset + buf_size)
-            fh.seek(file_size - offset)
-            buffer = fh.read(min(remaining_size, buf_size))
-            remaining_size -= buf_size
-            lines = buffer.split('\n')
-            # The first line of the buffer is probably not a complete line so
-            # we'll save it and append it to the last line of the next buffer
-            # we read
-            if segment is not None:
-                # If the previous chunk starts right from the beginning of line
-                # do not concat the segment to the last line of new chunk.
-                # Instead, yield the segment first 
-                if buffer[-1] != '\n':
-                    lines[-1] += segment
-                else:
-                    yield segment
-            segment = lines[0]
-            for index in range(len(lines) - 1, 0, -1):
-                if lines[index]:
-                    yield lines[index]
-        # Don't yield None if the file was empty
-        if segment is not None:
-            yield segment
-
-def bottomxmlTreeGetter(filename="2001_sample_10M.nml"):
-    rev = reverse_readline(filename)
-    stack = []
-    text = ""
-    firstdisplaydate = 0
-    while True:
-        try:
-            line = next(rev)
-        except:
-            break
-        text = line + text
-        if "<?xml" in line:
-            et = ET.fromstring(text)
-            if firstdisplaydate == 0:
-                firstdisplaydate = dateutil.parser.parse(displayDate(et)).timestamp()
-            if dateutil.parser.parse(displayDate(et)).timestamp() - firstdisplaydate > 259200:
-                break
-            stack += [et]
-            text = ""
-    stack.reverse()
+    for doc in docSlices(filename):
+        yield ET.fromstring(doc)
 
-    for et in stack:
-        yield et
 
 #getters for article with a given etree
 def article(etree):
@@ -148,13 +97,10 @@ def stem(tokenizedWords):
     r = []
     for word in tokenizedWords:
         if word in wordDict:
-            add = stemDict[wordDict[word]]
+            add = termIds.id(wordDict[word])
         else:
             w = stemmer.stem(word)
-            add = stemDict.get(w)
-            if (add == None):
-                add = len(stemDict)
-                stemDict[w] = add
+            add = termIds.id(w)
             wordDict[word] = w
         r += [add]
     return r
@@ -203,14 +149,22 @@ def staleNewsProcedure(ticker, story, companies, simtest):
     companyLL = companies[ticker]
     companyLL.resetCurr()
     compStory = companyLL.nextNode()
-    maxpq = []
+    neighbors = []
     while (compStory != None):
         if story.displayDate - compStory.displayDate > 259200:
             companyLL.cut();
             break;
-        sim = simtest(story, compStory)
-        heapq.heappush(maxpq, (sim, compStory)) #optimize here by limiting five? but already cut
+        neighbors.append(compStory)
         compStory = companyLL.nextNode()
+    if (simtest == similaritytest and neighbors != []):
+        # overlaps of all the neighbors from the postings of the window, in one pass
+        counts = companyLL.overlaps(story.textWords)
+        sims = [counts[compStory] / len(story.textWords) for compStory in neighbors]
+    else:
+        sims = [simtest(story, compStory) for compStory in neighbors]
+    maxpq = []
+    for sim, compStory in zip(sims, neighbors):
+        heapq.heappush(maxpq, (sim, compStory)) #optimize here by limiting five? but already cut
 
     largestFive = heapq.nlargest(5, maxpq)
 
@@ -246,10 +200,10 @@ class Story:
             self.textWords = stop(stem(word_tokenize(neighbor)))
         else:
             self.accessionNumber = accessionNum(et)
-            self.displayDate = dateutil.parser.parse(displayDate(et)).timestamp()
+            self.displayDate = parse_epoch(displayDate(et))
             self.tickers = tickercreator(et)
             self.text = article(et)
-            self.textWords = stop(stem(word_tokenize(article(et))))
+            self.textWords = stop(stem(word_tokenize(self.text)))
             self.headline = headline(et)
 
     def from_other(self, number, date, tick, txt, s):
@@ -268,16 +222,28 @@ class Story:
 class myLinkedList:
     '''A linked list. One key property of this LL is that the next node can be called with nextNode.
     If cut is called, the LL will be pruned (or cut) at the location of nextNode, so that unnecessary 
-    information can be easily removed.'''
+    information can be easily removed. The list also keeps the postings of its stories: for each term
+    id, the set of the stories that have it, updated when stories are added and cut.'''
     head = None
     end = None
     curr = None
     def __init__(self):
         self.head = LLNode("sentinel")
         self.end = self.head
+        self.postings = dict()
 
     def addFront(self, val):
         self.head.nextNode = LLNode(val, self.head.nextNode)
+        for term in val.textWords:
+            self.postings.setdefault(term, set()).add(val)
+
+    def overlaps(self, terms):
+        '''Returns a Counter of the number of terms each story of the list has.'''
+        counts = Counter()
+        for term in terms:
+            if term in self.postings:
+                counts.update(self.postings[term])
+        return counts
 
     def resetCurr(self):
         self.curr = self.head
@@ -290,7 +256,15 @@ class myLinkedList:
         return t
 
     def cut(self):
+        node = self.curr.nextNode
         self.curr.nextNode = None
+        while (node != None):
+            for term in node.val.textWords:
+                stories = self.postings[term]
+                stories.discard(node.val)
+                if (not stories):
+                    del self.postings[term]
+            node = node.nextNode
 
 class LLNode():
     val = None;
@@ -299,52 +273,32 @@ class LLNode():
         self.val = val
         self.nextNode = nextNode
 
-def procedureHelper(both, simtest=None, quiet=False, count=-1):
-    '''Written to parallelize code. Takes in params for one year and runs.'''
-    p = both[0]
-    f = both[1]
-    endlocation = both[2]
-    print("setup begun: ", str(f))
+def procedureHelper(task, simtest=None, quiet=False, count=-1):
+    '''Written to parallelize code. Takes in one time slice of the corpus (see SlicePlanner) and runs it.
+    The first warm articles are the warm-up, they only fill the linked lists. The rows of the others
+    are written to temp_save, in order.'''
+    entries, warm, temp_save = task
+    print("setup begun: ", temp_save)
     if (simtest == None):
         simtest = similaritytest
     companies = dict()
-    if p != None:
-        bxtg = bottomxmlTreeGetter(p)
-        while True:
-            try:
-                et = next(bxtg)
-            except Exception as e:
-                break
-            story = Story(et)
-            if (story.tickers == []):
-                continue
-            for ticker in story.tickers:
-                if '.' in ticker:
-                    continue
-                if ticker not in companies:
-                    companies[ticker] = myLinkedList()
-                companies[ticker].addFront(story)
-            
-    print("setup complete: ", str(f))
-
-    fname = f[f.rfind(os.file.sep)+1:f.rfind('.')]
-    with open(endlocation + '_' + fname + '.csv', 'w', newline='') as csvfile:
+    with open(temp_save, 'w', newline='') as csvfile:
         writer = csv.writer(csvfile, delimiter=',')
-        writer.writerow(['DATE_EST', 'STORY_ID', 'TICKER', 'HEADLINE', 'STORY_LENGTH', 'CLOSEST_ID', 'SECOND_CLOSEST_ID', 'CLOSEST_SCORE', 'TOTAL_OVERLAP', 'IS_OLD', 'IS_REPRINT', 'IS_RECOMB'])
-        if (not quiet):
-            print("File processing...",f)
-        xtg = xmlTreeGetter(f)
+        writer.writerow(HEADER)
         c = 0
-        while True:
+        for i, doc in enumerate(sliceGetter(entries)):
+            if (i == warm):
+                print("setup complete: ", temp_save)
+                if (not quiet):
+                    print("File processing...", temp_save)
             if (c == count):
                 break
             elif (not quiet and c!= 0 and c % 100 == 0):
-                print(f, c)
+                print(temp_save, c)
             try:
-                et = next(xtg)
+                story = Story(ET.fromstring(doc))
             except:
-                break
-            story = Story(et)
+                continue
             if (story.tickers == []):
                 continue;
             for ticker in story.tickers:
@@ -352,34 +306,50 @@ def procedureHelper(both, simtest=None, quiet=False, count=-1):
                     continue
                 if ticker not in companies:
                     companies[ticker] = myLinkedList()
-                p = staleNewsProcedure(ticker, story, companies, simtest)
-                writer.writerow(p)
-            c = c + 1
+                if (i < warm):
+                    companies[ticker].addFront(story)
+                else:
+                    p = staleNewsProcedure(ticker, story, companies, simtest)
+                    writer.writerow(p)
+            if (i >= warm):
+                c = c + 1
     if (not quiet):
-        print("Procedure finished: ", str(f))
+        print("Procedure finished: ", temp_save)
 
 
 #actual procedure fn
-def procedure(startlocation = 'data', endlocation='export_dataframe', simtest=None, processAll=True, quiet=True, count=1000):
+def procedure(startlocation = 'data', endlocation='export_dataframe', simtest=None, processAll=True, quiet=True, count=1000, slice_count=None, index_dir=None):
     '''Performs the procedure for the specified amount of articles. Uses all nml files from startlocation, and exports a csv file
-    at endlocation.'''
+    at endlocation.csv. The articles with tickers are cut into slice_count (default one per cpu) time slices with about the same
+    number of articles, whatever the file boundaries, and each slice is warmed up with the 72 hours before it. The slices run in
+    parallel and their rows are joined in order, so the output matches a sequential run row for row. count limits the number of
+    articles per slice unless processAll. The nml indexes are written next to the files, or in index_dir if given.'''
     print(startlocation, endlocation)
     location = sorted(glob.glob(startlocation + '/*.nml'))
     if (processAll):
         count = -1
     if (simtest == None):
         simtest = similaritytest
+    ensureIndexes(location, mp.cpu_count(), index_dir)
+    entries = corpusEntries(location, index_dir)
+    slices = planSlices(entries, slice_count or mp.cpu_count(), 259200)
     pool = mp.Pool(mp.cpu_count())
     print("Procedure begun.")
     start = time.time()
 
-    # add previous file and file to tuple to be parallelized (along with endlocation)
-    locationprev = []
-    location = [None] + location
-    for i in range(len(location) - 1):
-        locationprev += [(location[i], location[i + 1], endlocation)]
+    temp_files = [endlocation + '_slice_' + str(i) + '.csv' for i in range(len(slices))]
+    tasks = [(entries[s.warmup:s.end], s.start - s.warmup, temp) for s, temp in zip(slices, temp_files)]
+    r = pool.map(partial(procedureHelper, simtest=simtest, quiet=quiet, count=count), tasks, chunksize=1)
 
-    r = pool.map(procedureHelper, locationprev)
+    with open(endlocation + '.csv', 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile, delimiter=',')
+        writer.writerow(HEADER)
+        for temp in temp_files:
+            with open(temp, newline='') as part:
+                reader = csv.reader(part, delimiter=',')
+                next(reader)
+                writer.writerows(reader)
+            os.remove(temp)
 
     end = time.time()
     print('total time (s)= ' + str(end-start))
@@ -387,4 +357,6 @@ def procedure(startlocation = 'data', endlocation='export_dataframe', simtest=No
 
 
 if __name__ == '__main__':
-    procedure(sys.argv[1], sys.argv[2])
+    # Usage: python staleNewsProcedure.py nml_directory output_name [index_dir]
+    # The nml indexes go to index_dir, by default output_name_indexes, never into the corpus.
+    procedure(sys.argv[1], sys.argv[2], index_dir=sys.argv[3] if len(sys.argv) > 3 else sys.argv[2] + '_indexes')
@@ -0,0 +1,75 @@
+# compressed_benchmark.py
+# -------
+# End to end throughput (splitting and field extraction) of plain nml files
+# against the same files compressed with gzip, bzip2 and xz, and in a tar.gz
+# archive, with and without the background decompression thread of NMLReader
+# (which only pays off with a spare core).
+# Usage: python compressed_benchmark.py [file.nml ...]
+# Without arguments a synthetic sample is written with nml_sample.py.
+import bz2
+import gzip
+import lzma
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "object"))
+from FieldExtractor import extract
+from NMLReader import docSlices, streamGetter
+import nml_sample
+
+
+def compress(files, directory):
+    # Writes every file compressed in each format, and all of them in a tar.gz.
+    compressed = {}
+    for ext, module in ((".gz", gzip), (".bz2", bz2), (".xz", lzma)):
+        compressed[ext] = []
+        for f in files:
+            target = os.path.join(directory, os.path.basename(f) + ext)
+            with open(f, 'rb') as source, module.open(target, 'wb') as out:
+                shutil.copyfileobj(source, out)
+            compressed[ext].append(target)
+    archive = os.path.join(directory, "sample.tar.gz")
+    with tarfile.open(archive, 'w:gz') as tar:
+        for f in files:
+            tar.add(f, arcname=os.path.basename(f))
+    compressed[".tar.gz"] = [archive]
+    return compressed
+
+
+def run(name, files, getter, size):
+    start = time.perf_counter()
+    docs = 0
+    for f in files:
+        for doc in getter(f):
+            extract(doc)
+            docs += 1
+    elapsed = time.perf_counter() - start
+    stored = sum(os.path.getsize(f) for f in files)
+    print(f"{name:<18} {stored / 2**20:>8.1f} MB {docs:>9} docs {elapsed:>8.3f} s {docs / elapsed:>10.0f} docs/s {size / elapsed / 2**20:>8.1f} MB/s")
+    return docs
+
+
+if __name__ == '__main__':
+    files = sys.argv[1:]
+    directory = tempfile.mkdtemp()
+    if not files:
+        files = nml_sample.write_sample(directory, files=2, docs_per_file=20000)
+    size = sum(os.path.getsize(f) for f in files)
+    print(f"{len(files)} files, {size / 2**20:.1f} MB uncompressed")
+    compressed = compress(files, directory)
+
+    counts = [run("plain (mmap)", files, docSlices, size)]
+    for ext, targets in compressed.items():
+        counts.append(run(ext + " inline", targets, lambda f: streamGetter(f, read_ahead=0), size))
+        counts.append(run(ext + " read ahead", targets, streamGetter, size))
+    assert len(set(counts)) == 1, "readers disagree on the number of documents"
+
+    plain = [doc.tobytes() for f in files for doc in docSlices(f)]
+    for ext, targets in compressed.items():
+        assert plain == [doc for f in targets for doc in streamGetter(f)], ext + " documents differ"
+    print("READERS AGREE")
+    shutil.rmtree(directory)
@@ -0,0 +1,76 @@
+# cosine_benchmark.py
+# -------
+# Tf-idf cosine scores of measures/cosine_similarity.py on the company windows
+# of a corpus sample (the articles of the company within the 72 hour look
+# back): CosineSimilarity, which fits a TfidfVectorizer on every window, against
+# IncrementalCosineSimilarity with the document frequencies of the window (the
+# same scores) and with those of every article seen (an approximation). Times
+# the scores of every window, and prints the largest difference to the refit
+# scores and the fraction of articles with the same closest article.
+# Usage: python cosine_benchmark.py [file.nml ...]
+# Without arguments a synthetic sample is written with nml_sample.py.
+import os
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "object"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "measures"))
+from article import Article
+from cosine_similarity import CosineSimilarity, IncrementalCosineSimilarity
+from NMLReader import docGetter
+import nml_sample
+
+
+def windows(files, sim):
+    # (article, window) of every article and company, as nml_parseutil.py builds them.
+    k_seconds = sim.measure_const.NUM_HOURS * 60 * 60
+    seen = dict()
+    pairs = []
+    for f in files:
+        for doc in docGetter(f):
+            xml_elem = ET.fromstring(doc)
+            company = xml_elem.find(".//djn-company-sig")
+            if company is None:
+                continue
+            timestamp = xml_elem.find(".//djn-mdata").attrib['display-date']
+            headline = xml_elem.find(".//headline").text.lstrip()
+            text = sim.stem_and_filter("".join(xml_elem.find(".//text").itertext()))
+            for c in company:
+                if c.attrib.get('about', False) != 'Y' or "." in c.text:
+                    continue
+                article = Article(c.text, timestamp, headline, text, xml_elem.attrib['md5'])
+                prior = [a for a in seen.get(c.text, []) if article.elapsed_time_between(a) < k_seconds]
+                if prior:
+                    pairs.append((article, prior))
+                seen[c.text] = prior + [article]
+    return pairs
+
+
+def timed(name, sim, pairs):
+    start = time.perf_counter()
+    scores = [sim.similarity_scores(article, window) for article, window in pairs]
+    elapsed = time.perf_counter() - start
+    print(f"{name:<20} {elapsed:>8.3f} s {elapsed / max(len(pairs), 1) * 1e3:>8.3f} ms per article")
+    return scores, elapsed
+
+
+if __name__ == '__main__':
+    files = sys.argv[1:]
+    if not files:
+        files = nml_sample.write_sample(tempfile.mkdtemp(), files=1, docs_per_file=3000)
+    variants = [("refit", CosineSimilarity()), ("incremental window", IncrementalCosineSimilarity()),
+                ("incremental global", IncrementalCosineSimilarity(idf="global"))]
+    pairs = windows(files, variants[0][1])
+    print(f"{len(pairs)} articles, {sum(len(w) for _, w in pairs)} pairs")
+    results = [timed(name, sim, pairs) for name, sim in variants]
+    base, base_time = results[0]
+    for (name, _), (scores, elapsed) in zip(variants[1:], results[1:]):
+        diff = max((np.abs(s - b).max() for s, b in zip(scores, base)), default=0)
+        same = np.mean([np.argmax(s) == np.argmax(b) for s, b in zip(scores, base)]) if pairs else 1
+        print(f"{name}: {base_time / elapsed:.1f}x, largest difference {diff:.2e}, same closest {same:.1%}")
+    assert max((np.abs(s - b).max() for s, b in zip(results[1][0], base)), default=0) < 1e-9, "scores differ"
+    print("WINDOW SCORES AGREE")
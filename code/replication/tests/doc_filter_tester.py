@@ -0,0 +1,84 @@
+# doc_filter_tester.py
+# -------
+# Checks the ticker allow-list and date range of object/DocFilter.py. Every
+# article screened from its head by Article gets the outcome of the full
+# ElementTree parse: kept or not, its allowed tickers and its warm-up flag.
+# Then nml_parseutil.py is run with and without --tickers, --start and --end,
+# and the filtered rows must be the rows of the whole run for these tickers and
+# dates.
+# Usage: python doc_filter_tester.py [nml_directory]
+# Without arguments a synthetic sample is written with nml_sample.py.
+import csv
+import os
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(HERE, "..", "object"))
+sys.path.append(os.path.join(HERE, "..", "..", "measures"))
+from Article import Article
+from DocFilter import DocFilter
+from FieldExtractor import parseFields
+from NMLReader import docSlices, nmlFiles
+from timestamps import parse_epoch, parse_utc_epoch
+import nml_sample
+
+LOOK_BACK = 72 * 60 * 60 # The default k_hours of nml_parseutil
+
+
+def expected(doc, allowed, start, end):
+    # (tickers, warm-up) of an article from the full parse, None if rejected.
+    fields = parseFields(doc)
+    if fields is None:
+        return None
+    date = parse_epoch(fields[1])
+    tickers = [t for t in fields[2] if t in allowed]
+    if not tickers or date < start - LOOK_BACK or date >= end:
+        return None
+    return tickers, date < start
+
+
+def rows(directory, out, *options):
+    subprocess.run([sys.executable, "nml_parseutil.py", directory, out] + list(options),
+                   cwd=os.path.join(HERE, ".."), check=True, stdout=subprocess.DEVNULL)
+    with open(out, newline="") as f:
+        return list(csv.reader(f))[1:]
+
+
+if __name__ == '__main__':
+    directory = sys.argv[1] if len(sys.argv) > 1 else tempfile.mkdtemp()
+    if len(sys.argv) == 1:
+        nml_sample.write_sample(directory, files=1, docs_per_file=600)
+    docs = [doc.tobytes() for f in nmlFiles(directory) for doc in docSlices(f)]
+    parsed = [fields for fields in map(parseFields, docs) if fields is not None]
+    dates = sorted((parse_utc_epoch(fields[1]), fields[1]) for fields in parsed)
+    (start, startDate), (end, endDate) = dates[len(dates) * 2 // 5], dates[len(dates) * 4 // 5]
+    companies = sorted({t for fields in parsed for t in fields[2]})
+    allowed = companies[::2]
+
+    docFilter = DocFilter(allowed, startDate, endDate, LOOK_BACK)
+    differ = 0
+    for doc in docs:
+        story = Article(doc, docFilter)
+        if story.skipped is not None:
+            docFilter.count("header", story.skipped)
+        found = (story.tickers, story.warmup) if not story.bad and story.skipped is None else None
+        differ += found != expected(doc, set(allowed), start, end)
+    print(docFilter.report() or "Nothing skipped")
+    assert not differ, f"{differ} of {len(docs)} articles screened otherwise than parsed"
+    print(f"{len(docs)} articles, SCREENING AGREES")
+
+    out = tempfile.mkdtemp()
+    whole = rows(directory, os.path.join(out, "whole.csv"))
+    tickerFile = os.path.join(out, "tickers.txt")
+    with open(tickerFile, "w") as f:
+        f.write("\n".join(allowed))
+    filtered = rows(directory, os.path.join(out, "filtered.csv"), "--tickers", tickerFile,
+                    "--start", startDate, "--end", endDate)
+    displayed = {fields[0]: parse_utc_epoch(fields[1]) for fields in parsed}
+    kept = [r for r in whole if r[2] in allowed and start <= displayed[r[1]] < end]
+    print(f"{len(whole)} rows, {len(filtered)} filtered")
+    # CLOSEST_ID is dropped: among ties, it follows the iteration order of the window set.
+    assert sorted(r[:5] + r[6:] for r in filtered) == sorted(r[:5] + r[6:] for r in kept), "filtered rows differ"
+    print("ROWS AGREE")
@@ -0,0 +1,48 @@
+# extractor_tester.py
+# -------
+# Checks that FieldExtractor.extract returns the same fields as the ElementTree
+# getters of ETUtils for every article, and compares their speed.
+# Usage: python extractor_tester.py [file.nml ...]
+# Without arguments a synthetic sample is written with nml_sample.py.
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "object"))
+from FieldExtractor import extract, extractHeader, parseFields
+from NMLReader import docSlices
+import nml_sample
+
+
+def outcome(getter, doc):
+    try:
+        return getter(doc)
+    except Exception as e:
+        return "ERROR " + type(e).__name__
+
+
+if __name__ == '__main__':
+    files = sys.argv[1:]
+    if not files:
+        files = nml_sample.write_sample(tempfile.mkdtemp(), files=1, docs_per_file=5000)
+    docs = [doc.tobytes() for f in files for doc in docSlices(f)]
+
+    differences = 0
+    for doc in docs:
+        expected, actual = outcome(parseFields, doc), outcome(extract, doc)
+        if expected != actual and not str(expected).startswith("ERROR"):
+            differences += 1
+            print("DIFFERENT:", str(expected)[:100], "|", str(actual)[:100])
+        header = outcome(extractHeader, doc)
+        if expected is None and isinstance(header, tuple) and header[2]:
+            differences += 1
+            print("TICKERS WITHOUT FIELDS:", header)
+    print(f"{len(docs)} articles, {differences} differences")
+
+    for name, getter in (("ElementTree", parseFields), ("extract", extract), ("extractHeader", extractHeader)):
+        start = time.perf_counter()
+        for doc in docs:
+            outcome(getter, doc)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<14} {len(docs) / elapsed:>10.0f} articles/s")
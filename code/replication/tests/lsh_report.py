@@ -0,0 +1,64 @@
+# lsh_report.py
+# -------
+# Accuracy against speed of measures/lsh_similarity.py on the company windows
+# of a corpus sample: LSHSimilarity, which scores only the articles sharing an
+# LSH bucket with each article, for several bands and rows, against the exact
+# BOWSimilarity over every article of the window. Prints the time of each, the
+# articles scored, the fraction of articles with the same ClosestNeighbor(s),
+# the same closest among the near duplicates (ClosestNeighbor(s) of at least
+# 0.8), the mean error of Old(s), and the agreement of the old news and reprint
+# flags. Old(s) takes the union of the closest articles, often far from near
+# duplicates, so it suffers first; fallback scores the whole window of the
+# articles without candidates.
+# Usage: python lsh_report.py [file.nml ...]
+# Without arguments a synthetic sample is written with nml_sample.py.
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "measures"))
+from bow_similarity import BOWSimilarity
+from lsh_similarity import LSHSimilarity
+from cosine_benchmark import windows
+import nml_sample
+
+SETTINGS = [(32, 4, False), (16, 8, False), (32, 8, False), (8, 16, False), (32, 8, True)]
+NEAR_DUPLICATE = 0.8
+
+
+def run(sim, pairs):
+    start = time.perf_counter()
+    results = [sim.compute_sim_measure(article, window) for article, window in pairs]
+    return results, time.perf_counter() - start
+
+
+def flags(sim, results):
+    return [(sim.is_old_news(old), sim.is_reprint(old, closest)) for old, closest, _ in results]
+
+
+if __name__ == '__main__':
+    files = sys.argv[1:]
+    if not files:
+        files = nml_sample.write_sample(tempfile.mkdtemp(), files=1, docs_per_file=3000)
+    exact = BOWSimilarity()
+    pairs = windows(files, exact)
+    print(f"{len(pairs)} articles, {sum(len(w) for _, w in pairs)} pairs")
+    base, base_time = run(exact, pairs)
+    base_flags = flags(exact, base)
+    near = [i for i, b in enumerate(base) if b[1] >= NEAR_DUPLICATE]
+    print(f"{'exact':<20} {base_time:>8.3f} s, {len(near)} near duplicates")
+    for bands, rows, fallback in SETTINGS:
+        sim = LSHSimilarity(bands=bands, rows=rows, fallback=fallback)
+        results, elapsed = run(sim, pairs)
+        closest = np.mean([r[1] == b[1] for r, b in zip(results, base)])
+        duplicates = np.mean([results[i][1] == base[i][1] for i in near]) if near else 1
+        error = np.mean([b[0] - r[0] for r, b in zip(results, base)])
+        old, reprint = (np.mean([r[i] == b[i] for r, b in zip(flags(sim, results), base_flags)]) for i in (0, 1))
+        name = f"{bands} x {rows}" + (" fallback" if fallback else "")
+        print(f"{name:<20} {elapsed:>8.3f} s {base_time / elapsed:>5.1f}x  same closest {closest:.1%} "
+              f"({duplicates:.1%} of near duplicates), mean Old(s) error {error:.4f}, "
+              f"old news flag {old:.1%}, reprint flag {reprint:.1%}")
+        print("  " + sim.report())
@@ -0,0 +1,77 @@
+# near_duplicate_report.py
+# -------
+# The corpus-wide near-duplicate index of object/NearDuplicates.py against an
+# exact pass over every pair of articles displayed within the look back, of
+# any ticker or none: the time of both (the sketches, which the suppliers
+# compute, apart from the index itself), the prior articles the index scores,
+# the fraction of the near duplicates (articles whose closest prior article has
+# at least the threshold of their terms) for which the index finds that score,
+# and the number and largest size of the clusters.
+# Usage: python near_duplicate_report.py [file.nml ...]
+# Without arguments a synthetic sample is written with nml_sample.py.
+import os
+import sys
+import tempfile
+import time
+from collections import Counter, deque
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "object"))
+from Article import Article
+from DocFilter import DocFilter
+from NMLReader import docGetter
+from NearDuplicates import NearDuplicateIndex
+from Similarity import BoWSimularity
+from term_ids import overlaps
+import nml_sample
+
+
+def stories(files, simtest):
+    docFilter = DocFilter(clusters=True)
+    for f in files:
+        for doc in docGetter(f):
+            story = Article(doc, docFilter)
+            if not story.bad and story.skipped is None:
+                simtest.preprocessing(story)
+                yield story.record()
+
+
+def exact(index, stories, simtest):
+    # The best score of each story over all the prior ones within the look back.
+    prior, best = deque(), []
+    for story in stories:
+        while prior and story.displayDate - prior[0][0] > index.look_back:
+            prior.popleft()
+        ids = index.ids(simtest.terms(story))
+        scores = overlaps(ids, [p[1] for p in prior]) / len(ids) if prior and len(ids) else []
+        best.append(float(np.max(scores)) if len(scores) else None)
+        prior.append((story.displayDate, ids))
+    return best
+
+
+if __name__ == '__main__':
+    files = sys.argv[1:]
+    if not files:
+        files = nml_sample.write_sample(tempfile.mkdtemp(), files=1, docs_per_file=3000)
+    simtest = BoWSimularity()
+    records = list(stories(files, simtest))
+    index = NearDuplicateIndex(simtest.look_back)
+    start = time.perf_counter()
+    sketches = [index.sketch(simtest.terms(story)) for story in records]
+    sketchTime = time.perf_counter() - start
+    start = time.perf_counter()
+    found = [index.assign(story, sketch) for story, sketch in zip(records, sketches)]
+    elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    best = exact(NearDuplicateIndex(simtest.look_back), records, simtest)
+    exactTime = time.perf_counter() - start
+    untagged = sum(not story.tickers for story in records)
+    print(f"{len(records)} stories ({untagged} without tickers), sketches {sketchTime:.3f} s, "
+          f"index {elapsed:.3f} s, exact {exactTime:.3f} s")
+    print(index.report())
+    near = [i for i, b in enumerate(best) if b is not None and b >= index.threshold]
+    same = np.mean([found[i][2] == best[i] for i in near]) if near else 1
+    sizes = Counter(cluster for cluster, _, _ in found)
+    print(f"{len(near)} near duplicates, {same:.1%} found with the same score")
+    print(f"{len(sizes)} clusters, the largest of {max(sizes.values(), default=0)} stories")
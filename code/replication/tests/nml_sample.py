@@ -0,0 +1,125 @@
+# nml_sample.py
+# -------
+# Writes synthetic Dow Jones NML files for the NML testers and benchmarks when
+# the licensed archive is not available. Documents follow the DJN layout read by
+# object/ETUtils.py: md5 on <doc>, display-date on <djn-mdata>, tickers in
+# <djn-company>, headline and <text> paragraphs in <body>.
+import datetime
+import hashlib
+import os
+import random
+import sys
+
+WORDS = ("company profit revenue quarter shares stock market investors analysts said "
+         "percent million billion earnings growth sales report expected year fiscal "
+         "board chief executive officer deal merger acquisition bank rates fund price "
+         "oil energy technology software chip demand supply contract government court "
+         "lawsuit settlement dividend forecast guidance outlook loss debt bond credit "
+         "rating downgrade upgrade trading exchange index rose fell gained dropped "
+         "announced agreed plans expects reported increased decreased strong weak "
+         "new york london tokyo federal reserve interest inflation economy jobs "
+         "consumer retail store customers products services operations unit division").split()
+
+TICKERS = ["IBM", "MSFT", "INTC", "GE", "XOM", "C", "JPM", "WMT", "PFE", "T",
+           "ORCL", "CSCO", "KO", "PG", "MRK", "BRK.A", "HPQ", "DELL", "AAPL", "AMZN"]
+
+TEMPLATE = """<?xml version="1.0" encoding="iso-8859-1" ?>
+<doc transmission-date="{date}" md5="{md5}">
+<djnml publisher="DJN" docdate="{day}" product="DN" seq="{seq}" lang="en-us">
+<head>
+<docdata>
+<djn>
+<djn-newswires news-source="DJDN" origin="DJ" service-id="CO">
+<djn-press-cutout/>
+<djn-urgency>0</djn-urgency>
+<djn-mdata brand="DJ" temp-perm="P" retention="N" hot="N" original-source="T" accession-number="{day}{seq:06d}" page-citation="" display-date="{date}">
+<djn-coding>
+{company}<djn-subject>
+<c>N/ERN</c>
+</djn-subject>
+</djn-coding>
+</djn-mdata>
+</djn-newswires>
+</djn>
+</docdata>
+</head>
+<body>
+<headline brand-display="DJ" prefix=""> {headline}</headline>
+<text>
+{text}</text>
+</body>
+</djnml>
+</doc>
+"""
+
+
+def paragraph(rng, length):
+    words = [rng.choice(WORDS) for _ in range(length)]
+    words[0] = words[0].capitalize()
+    return " ".join(words) + "."
+
+
+def company_block(tickers):
+    if not tickers:
+        return ""
+    codes = "".join(f"<c>{t}</c>\n" for t in tickers)
+    sig = "".join(f'<c about="Y">{t}</c>\n' for t in tickers)
+    return f"<djn-company>\n{codes}</djn-company>\n<djn-company-sig>\n{sig}</djn-company-sig>\n"
+
+
+def documents(count, start=datetime.datetime(2001, 1, 2), seed=0, mean_gap=60):
+    """
+    Generates count NML documents in chronological order. Roughly a third of
+    the stories are reprints or recombinations of earlier stories, a few have no
+    tickers and a few carry escaped characters.
+    """
+    rng = random.Random(seed)
+    when = start
+    history = []
+    for seq in range(count):
+        when += datetime.timedelta(seconds=rng.randint(1, 2 * mean_gap))
+        roll = rng.random()
+        if history and roll < 0.2:
+            tickers, paragraphs = rng.choice(history[-200:])
+            paragraphs = list(paragraphs)
+        elif history and roll < 0.35:
+            tickers, first = rng.choice(history[-200:])
+            _, second = rng.choice(history[-200:])
+            paragraphs = list(first[:2]) + list(second[2:]) + [paragraph(rng, 20)]
+        else:
+            tickers = [] if rng.random() < 0.1 else rng.sample(TICKERS, rng.randint(1, 3))
+            paragraphs = [paragraph(rng, rng.randint(15, 60)) for _ in range(rng.randint(2, 8))]
+            if rng.random() < 0.05:
+                paragraphs.append("Johnson &amp; Johnson said sales &lt; forecast.")
+        history.append((tickers, tuple(paragraphs)))
+        text = "<pre>\n  NEW YORK (Dow Jones)--\n</pre>\n" + "".join(f"<p>\n {p}\n</p>\n" for p in paragraphs)
+        date = when.strftime("%Y%m%dT%H%M%SZ")
+        yield TEMPLATE.format(date=date, day=when.strftime("%Y%m%d"), seq=seq,
+                              md5=hashlib.md5(f"{seed}-{seq}".encode()).hexdigest(),
+                              company=company_block(tickers),
+                              headline=" ".join(paragraphs[0].split()[:6]), text=text)
+
+
+def write_sample(directory, files=3, docs_per_file=2000, seed=0):
+    """
+    Writes files consecutive daily-style NML files into directory and returns
+    their paths in chronological order.
+    """
+    os.makedirs(directory, exist_ok=True)
+    docs = documents(files * docs_per_file, seed=seed)
+    paths = []
+    for i in range(files):
+        path = os.path.join(directory, f"sample_{i:03d}.nml")
+        with open(path, "w", encoding="iso-8859-1") as f:
+            for _ in range(docs_per_file):
+                f.write(next(docs))
+        paths.append(path)
+    return paths
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("usage: python nml_sample.py <directory> [files] [docs_per_file]")
+        sys.exit(1)
+    args = [int(a) for a in sys.argv[2:4]]
+    print("\n".join(write_sample(sys.argv[1], *args)))
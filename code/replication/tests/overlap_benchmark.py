@@ -0,0 +1,85 @@
+# overlap_benchmark.py
+# -------
+# Overlap kernels of object/Similarity.py on the ticker windows of a corpus
+# sample: BoWSimularity (sets of stems) against ArraySimularity (sorted uint32
+# arrays) and its bitmap variant. Times the pairwise scores one pair at a time,
+# then per story (similarityBatch over its window, which is numpy for all of
+# them, and the Old(s) union of its five closest), and checks that every score
+# is the same.
+# Usage: python overlap_benchmark.py [file.nml ...]
+# Without arguments a synthetic sample is written with nml_sample.py.
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "object"))
+from Article import Article
+from NMLReader import docGetter
+from Similarity import ArraySimularity, BoWSimularity
+import nml_sample
+
+
+def windows(files, simtest):
+    # (story, window) of every article and ticker, the window most recent first.
+    seen = defaultdict(list)
+    pairs = []
+    for f in files:
+        for doc in docGetter(f):
+            story = Article(doc)
+            if story.bad or not story.tickers:
+                continue
+            simtest.preprocessing(story)
+            for ticker in story.tickers:
+                prior = seen[ticker]
+                while prior and story.displayDate - prior[0].displayDate > simtest.look_back:
+                    prior.pop(0)
+                pairs.append((story, prior[::-1]))
+                prior.append(story)
+    return pairs
+
+
+def perPair(simtest, pairs):
+    return [simtest.similaritytest(story, [n]) for story, window in pairs for n in window]
+
+
+def perStory(simtest, pairs):
+    results = []
+    for story, window in pairs:
+        scores = simtest.similarityBatch(story, window).tolist()
+        top = sorted(range(len(window)), key=lambda i: -scores[i])[:simtest.num_closest]
+        old = simtest.similaritytest(story, [window[i] for i in top]) if top else 0
+        results.append((list(scores), old))
+    return results
+
+
+def timed(name, run, simtest, pairs, count):
+    start = time.perf_counter()
+    result = run(simtest, pairs)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<24} {elapsed:>8.3f} s {elapsed / max(count, 1) * 1e6:>9.2f} us each")
+    return result, elapsed
+
+
+if __name__ == '__main__':
+    files = sys.argv[1:]
+    if not files:
+        files = nml_sample.write_sample(tempfile.mkdtemp(), files=1, docs_per_file=3000)
+    variants = [("sets", BoWSimularity()), ("arrays", ArraySimularity()), ("bitmaps", ArraySimularity(bitmaps=True))]
+    prepared = [windows(files, simtest) for _, simtest in variants]
+    for (_, simtest), pairs in zip(variants[1:], prepared[1:]):
+        for story, window in pairs:
+            simtest.localize(story)
+    pairCount = sum(len(window) for _, window in prepared[0])
+    print(f"{len(prepared[0])} stories, {pairCount} pairs")
+
+    pairResults = [timed(name + " per pair", perPair, simtest, pairs, pairCount)
+        for (name, simtest), pairs in zip(variants, prepared)]
+    storyResults = [timed(name + " per story", perStory, simtest, pairs, len(pairs))
+        for (name, simtest), pairs in zip(variants, prepared)]
+    for results in (pairResults, storyResults):
+        base = results[0][1]
+        print("Speedup...", ", ".join(f"{name} {base / elapsed:.1f}x" for (name, _), (_, elapsed) in zip(variants[1:], results[1:])))
+        assert all(result == results[0][0] for result, _ in results[1:]), "scores differ"
+    print("SCORES AGREE")
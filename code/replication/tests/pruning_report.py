@@ -0,0 +1,59 @@
+# pruning_report.py
+# -------
+# How much of the ticker windows of a corpus the pruned search of
+# IndexedBoWSimularity.closest skips: with prune, the neighbours are scored in
+# the order of their length bound (min(|A|, |B|) / |A|) until it falls below
+# the num_closest-th best overlap, and only those found in the postings of the
+# rarest stems of the story (prefix filtering). Prints the fraction of
+# candidates not scored, the windows scored in full because of ties, and the
+# time of the procedure with and without prune, and checks that the rows are
+# the same.
+# Usage: python pruning_report.py [file.nml ...]
+# Without arguments a synthetic sample is written with nml_sample.py.
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "object"))
+from Article import Article
+from NMLReader import docGetter
+from Similarity import IndexedBoWSimularity
+import nml_sample
+
+
+def stories(files, simtest):
+    for f in files:
+        for doc in docGetter(f):
+            story = Article(doc)
+            if not story.bad and story.tickers:
+                simtest.preprocessing(story)
+                yield story.record()
+
+
+def rows(records, simtest):
+    # The rows of every story and ticker, as a processor writes them.
+    companies = dict()
+    for story in records:
+        for ticker in story.tickers:
+            if ticker not in companies:
+                companies[ticker] = simtest.newWindow()
+            yield simtest.staleNewsProcedure(ticker, story, companies[ticker])
+
+
+if __name__ == '__main__':
+    files = sys.argv[1:]
+    if not files:
+        files = nml_sample.write_sample(tempfile.mkdtemp(), files=1, docs_per_file=3000)
+    full, pruned = IndexedBoWSimularity(), IndexedBoWSimularity(prune=True)
+    records = list(stories(files, full))
+    print(f"{len(records)} stories")
+    results = []
+    for name, simtest in (("full", full), ("pruned", pruned)):
+        start = time.perf_counter()
+        results.append(list(rows(records, simtest)))
+        print(f"{name:<8} {time.perf_counter() - start:>8.3f} s")
+    print(pruned.report().splitlines()[-1])
+    differ = sum(a != b for a, b in zip(*results))
+    assert not differ, f"{differ} of {len(results[0])} rows differ"
+    print("ROWS AGREE")
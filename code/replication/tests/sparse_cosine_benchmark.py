@@ -0,0 +1,45 @@
+# sparse_cosine_benchmark.py
+# -------
+# Cosine kernels of object/Similarity.py on the ticker windows of a corpus
+# sample: CosineSimilarity (Counters of stems, Python loops) against
+# SparseCosineSimilarity (sorted id and weight arrays with their norm). Times
+# the pairwise scores one pair at a time, then per story (similarityBatch over
+# its window and the Old(s) score of the union of its five closest), and
+# checks that the scores are the same, within rounding.
+# Usage: python sparse_cosine_benchmark.py [file.nml ...]
+# Without arguments a synthetic sample is written with nml_sample.py.
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "object"))
+from Similarity import CosineSimilarity, SparseCosineSimilarity
+from overlap_benchmark import windows, perPair, perStory, timed
+import nml_sample
+
+
+def close(a, b):
+    return np.allclose(np.array(a, dtype=np.float64), np.array(b, dtype=np.float64), rtol=1e-12, atol=0, equal_nan=True)
+
+
+if __name__ == '__main__':
+    files = sys.argv[1:]
+    if not files:
+        files = nml_sample.write_sample(tempfile.mkdtemp(), files=1, docs_per_file=3000)
+    variants = [("counters", CosineSimilarity()), ("arrays", SparseCosineSimilarity())]
+    prepared = [windows(files, simtest) for _, simtest in variants]
+    pairCount = sum(len(window) for _, window in prepared[0])
+    print(f"{len(prepared[0])} stories, {pairCount} pairs")
+
+    pairResults = [timed(name + " per pair", perPair, simtest, pairs, pairCount)
+        for (name, simtest), pairs in zip(variants, prepared)]
+    storyResults = [timed(name + " per story", perStory, simtest, pairs, len(pairs))
+        for (name, simtest), pairs in zip(variants, prepared)]
+    (base, baseTime), (result, elapsed) = pairResults
+    print(f"Speedup... per pair {baseTime / elapsed:.1f}x, per story {storyResults[0][1] / storyResults[1][1]:.1f}x")
+    assert close(base, result), "pair scores differ"
+    for (scores, old), (otherScores, otherOld) in zip(storyResults[0][0], storyResults[1][0]):
+        assert close(scores, otherScores) and close(old, otherOld), "story scores differ"
+    print("SCORES AGREE")
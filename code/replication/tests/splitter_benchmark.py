@@ -0,0 +1,60 @@
+# splitter_benchmark.py
+# -------
+# Throughput of the nml document splitters: the line concatenating getters
+# (ETUtils.textGetter and the xmlTreeGetter loop of the procedure scripts)
+# against the memory mapped NMLReader.docSlices / mmapTextGetter.
+# Usage: python splitter_benchmark.py [file.nml ...]
+# Without arguments a synthetic sample is written with nml_sample.py.
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "object"))
+from ETUtils import textGetter
+from NMLReader import docSlices, mmapTextGetter
+import nml_sample
+
+
+def concatGetter(filename):
+    # The loop of xmlTreeGetter without the ElementTree parse.
+    nmlFile = open(filename)
+    text = ""
+    for line in nmlFile:
+        text += line
+        if "</doc>" in line:
+            yield text
+            text = ""
+
+
+def sliceLengths(filename):
+    for doc in docSlices(filename):
+        yield doc.nbytes
+
+
+def run(name, getter, files, size):
+    start = time.perf_counter()
+    docs = 0
+    for f in files:
+        for _ in getter(f):
+            docs += 1
+    elapsed = time.perf_counter() - start
+    print(f"{name:<16} {docs:>9} docs {elapsed:>8.3f} s {docs / elapsed:>12.0f} docs/s {size / elapsed / 2**20:>9.1f} MB/s")
+    return docs
+
+
+if __name__ == '__main__':
+    files = sys.argv[1:]
+    if not files:
+        files = nml_sample.write_sample(tempfile.mkdtemp(), files=2, docs_per_file=20000)
+    size = sum(os.path.getsize(f) for f in files)
+    print(f"{len(files)} files, {size / 2**20:.1f} MB")
+    counts = [run("textGetter", textGetter, files, size),
+              run("concat loop", concatGetter, files, size),
+              run("docSlices", sliceLengths, files, size),
+              run("mmapTextGetter", mmapTextGetter, files, size)]
+    assert len(set(counts)) == 1, "splitters disagree on the number of documents"
+    for f in files:
+        for a, b in zip(textGetter(f), docSlices(f)):
+            assert a == b.tobytes().decode("utf-8", "replace").replace("\r\n", "\n")
+    print("SPLITTERS AGREE")
@@ -0,0 +1,75 @@
+# story_memory_report.py
+# -------
+# Memory the processors spend on the stories of the linked lists: bytes per
+# story and per ticker window (all the stories of a ticker within the 72 hour
+# look back), for the whole Article with its text and headline, the Article
+# without them, and the slotted StoryRecord, each as a processor unpickles it.
+# Usage: python story_memory_report.py [file.nml ...]
+# Without arguments a synthetic sample is written with nml_sample.py.
+import os
+import pickle
+import sys
+import tempfile
+import tracemalloc
+from collections import defaultdict
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "object"))
+from Article import Article
+from NMLReader import docGetter
+from Similarity import BoWSimularity, HashedBoWSimularity
+import nml_sample
+
+LOOK_BACK = 259200
+
+
+def stories(files, simtest):
+    for f in files:
+        for doc in docGetter(f):
+            story = Article(doc)
+            if not story.bad and story.tickers:
+                simtest.preprocessing(story)
+                yield story
+
+
+def withoutText(story):
+    story.headline, story.text = None, None
+    return story
+
+
+def measure(payloads):
+    # Bytes allocated by unpickling every payload, as the processors do.
+    tracemalloc.start()
+    held = [pickle.loads(p) for p in payloads]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, held
+
+
+def windowStories(stories):
+    # Mean number of stories in the window of a ticker, over every article.
+    seen, sizes = defaultdict(list), []
+    for story in stories:
+        for ticker in story.tickers:
+            prior = seen[ticker]
+            while prior and story.displayDate - prior[0] > LOOK_BACK:
+                prior.pop(0)
+            prior.append(story.displayDate)
+            sizes.append(len(prior))
+    return sum(sizes) / max(len(sizes), 1)
+
+
+if __name__ == '__main__':
+    files = sys.argv[1:]
+    if not files:
+        files = nml_sample.write_sample(tempfile.mkdtemp(), files=1, docs_per_file=3000)
+    for simtest in (BoWSimularity(), HashedBoWSimularity()):
+        preprocessed = list(stories(files, simtest))
+        window = windowStories(preprocessed)
+        print(f"{type(simtest).__name__}: {len(preprocessed)} stories, {window:.1f} stories per ticker window")
+        forms = [("Article with text", lambda s: s), ("Article without text", withoutText),
+                 ("StoryRecord", lambda s: s.record())]
+        for name, form in forms:
+            payloads = [pickle.dumps(form(s)) for s in preprocessed]
+            size, _ = measure(payloads)
+            perStory = size / len(payloads)
+            print(f"  {name:<22} {perStory:>9.0f} bytes per story {perStory * window:>12.0f} bytes per window")
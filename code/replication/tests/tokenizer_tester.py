@@ -0,0 +1,90 @@
+# tokenizer_tester.py
+# -------
+# Equivalence harness for measures/tokenizer.py against nltk's word_tokenize.
+# Both tokenizers are run over the articles of a corpus sample; the harness
+# reports the articles whose token lists and textWords sets (stemmed, without
+# stop words) differ, replays the stale news procedure (BoWSimularity) with
+# each one to compare the Old(s) scores, and prints the speedup.
+# Usage: python tokenizer_tester.py [file.nml ...]
+# Without arguments a synthetic sample is written with nml_sample.py.
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from nltk.tokenize import word_tokenize as nltk_tokenize
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "object"))
+from Article import Article
+from LL import myLinkedList
+from NMLReader import docGetter
+from Similarity import BoWSimularity
+from tokenizer import word_tokenize as fast_tokenize
+import nml_sample
+
+# Punctuation the synthetic sample lacks: quotes, clitics, brackets, ellipses,
+# abbreviations and sentence ends inside closing quotes.
+PUNCTUATED = [
+    "\"We're pleased,\" said Mr. Smith, chief executive of J.P. Morgan Chase & Co.",
+    "Shares of Intel Corp. (Nasdaq: INTC) rose 2.5% to $31.25 in U.S. trading.",
+    "The company's profit didn't meet forecasts; analysts can't explain it...",
+    "He told Dow Jones Newswires: 'the deal is done' on Jan. 5.\n\"Next,\" he said.",
+    "Revenue -- excluding items -- fell 3 cents a share, or $1,234.56 million?!",
+    "(Sales rose 4:15 p.m. EST.) 'Tis the season, gonna wanna gimme more'n that.",
+    "The Nasdaq lost 3.2 pts. to 2,470.52 vs. 2,510.10 “yesterday” — e.g. «today».",
+]
+
+
+def articles(files):
+    for f in files:
+        for doc in docGetter(f):
+            story = Article(doc)
+            if not story.bad and story.tickers:
+                yield story
+
+
+def timed(tokenize, texts):
+    start = time.perf_counter()
+    tokens = [tokenize(t) for t in texts]
+    return tokens, time.perf_counter() - start
+
+
+def oldScores(stories, pres):
+    # Old(s) of every (article, ticker) pair, as in Procedure with one processor.
+    simtest = BoWSimularity()
+    companies = defaultdict(myLinkedList)
+    scores = []
+    for story, pre in zip(stories, pres):
+        story.pre = pre
+        for ticker in story.tickers:
+            scores.append(simtest.staleNewsProcedure(ticker, story, companies[ticker])[7])
+    return scores
+
+
+if __name__ == '__main__':
+    files = sys.argv[1:]
+    if not files:
+        files = nml_sample.write_sample(tempfile.mkdtemp(), files=1, docs_per_file=3000)
+    stories = list(articles(files))
+    texts = [s.text for s in stories] + PUNCTUATED
+    old, old_time = timed(nltk_tokenize, texts)
+    new, new_time = timed(fast_tokenize, texts)
+    print(f"{len(texts)} texts, word_tokenize {old_time:.3f} s, tokenizer {new_time:.3f} s, {old_time / new_time:.1f}x")
+
+    simtest = BoWSimularity()
+    token_diffs = [i for i in range(len(texts)) if old[i] != new[i]]
+    old_words = [simtest.stop(simtest.stem(tokens)) for tokens in old]
+    new_words = [simtest.stop(simtest.stem(tokens)) for tokens in new]
+    word_diffs = [i for i in range(len(texts)) if old_words[i] != new_words[i]]
+    for i in word_diffs[:5]:
+        print("textWords differ:", repr(texts[i][:80]), sorted(old_words[i] ^ new_words[i]))
+    print(f"Token lists differ: {len(token_diffs)}, textWords sets differ: {len(word_diffs)}")
+
+    n = len(stories)
+    old_scores = oldScores(stories, old_words[:n])
+    new_scores = oldScores(stories, new_words[:n])
+    score_diffs = sum(a != b for a, b in zip(old_scores, new_scores))
+    print(f"Old(s) scores differ: {score_diffs} of {len(old_scores)}")
+    assert not token_diffs and not word_diffs and not score_diffs, "tokenizers disagree"
+    print("TOKENIZERS AGREE")